@@ -0,0 +1,140 @@
+import numpy as np
+
+
+def random_picks(size: int, count: int, previous: int, rng) -> np.ndarray:
+  """
+  Draws count indices in [0, size) where no index repeats the one before it.
+
+  Each pick is the previous pick shifted by a uniform offset in [1, size - 1]
+  (mod size), which is the same as a uniform choice among the other size - 1
+  indices, so the whole sequence is a single cumulative sum.
+
+  Args:
+      size (int): The number of candidates.
+      count (int): The number of picks to draw.
+      previous (int): The index of the previous pick, or -1 if it is not a candidate.
+      rng (np.random.Generator): The random number generator.
+  """
+  if size == 1 or count == 0:
+    return np.zeros(count, dtype=np.intp)
+  steps = rng.integers(1, size, size=count)
+  if previous < 0:
+    # Nothing to avoid on the first pick, so it is uniform over every candidate
+    steps[0] = rng.integers(0, size)
+    previous = 0
+  picks = np.cumsum(steps)
+  picks += previous
+  picks %= size
+  return picks
+
+
+def weighted_random_picks(weights: np.ndarray, count: int, previous: int, rng) -> np.ndarray:
+  """
+  Draws count indices with probability proportional to weights where no index repeats the one before it.
+
+  Drawing independent weighted picks and dropping every pick that equals the
+  one kept before it gives exactly the picks of the selector's alias table,
+  which draws weighted and rejects the previous pick. Picks are drawn in
+  chunks until enough are kept.
+
+  Args:
+      weights (np.ndarray): The weight of each candidate.
+      count (int): The number of picks to draw.
+      previous (int): The index of the previous pick, or -1 if it is not a candidate.
+      rng (np.random.Generator): The random number generator.
+
+  Raises:
+      IndexError: If the picks cannot avoid back-to-back repeats, because fewer
+          than two candidates have a positive weight.
+  """
+  positive = np.flatnonzero(weights > 0)
+  if count and (len(positive) == 0 or len(positive) == 1 and (count > 1 or positive[0] == previous)):
+    raise IndexError('Cannot choose from an empty table')
+  probabilities = weights / weights.sum()
+  # The share of independent picks that differ from the pick before them
+  kept = 1.0 - float(np.dot(probabilities, probabilities))
+  chunks = []
+  total = 0
+  while total < count:
+    draws = rng.choice(len(weights), size=int((count - total) / kept * 1.1) + 16, p=probabilities)
+    before = np.empty_like(draws)
+    before[0] = previous
+    before[1:] = draws[:-1]
+    # Within a chunk a run of equal picks keeps only its first pick
+    draws = draws[draws != before]
+    if len(draws):
+      chunks.append(draws[:count - total])
+      total += len(chunks[-1])
+      previous = chunks[-1][-1]
+  return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.intp)
+
+
+def _avoid_back_to_back(rows: np.ndarray, previous: int, rng) -> None:
+  """
+  Makes sure no row of permutations starts with the last pick before it.
+
+  A row that starts with the pick before it gets its first element swapped with
+  a uniformly chosen later position, which leaves the row uniform over all
+  permutations that do not start with that pick. Swapping into the last slot
+  changes the pick the next row is compared against, so the check is
+  re-run for that row.
+  """
+  length = rows.shape[1]
+  if length < 2:
+    return
+  before = np.empty(len(rows), dtype=rows.dtype)
+  before[0] = previous
+  before[1:] = rows[:-1, -1]
+  pending = np.flatnonzero(rows[:, 0] == before).tolist()
+
+  position = 0
+  while position < len(pending):
+    row = pending[position]
+    position += 1
+    last = previous if row == 0 else rows[row - 1, -1]
+    if rows[row, 0] != last:
+      continue
+    swap = rng.integers(1, length)
+    rows[row, 0], rows[row, swap] = rows[row, swap], rows[row, 0]
+    following = row + 1
+    if swap == length - 1 and following < len(rows) and rows[following, 0] == rows[row, -1]:
+      if position >= len(pending) or pending[position] != following:
+        pending.insert(position, following)
+
+
+def cycle_picks(size: int, count: int, unselected: np.ndarray, previous: int,
+                rng) -> tuple[np.ndarray, np.ndarray]:
+  """
+  Draws count indices in [0, size) the way cycle mode does, a whole cycle at a time.
+
+  The picks first drain the unselected indices of the cycle in progress, then
+  continue with full permutations of every index. No pick repeats the one
+  before it, including across cycle boundaries.
+
+  Args:
+      size (int): The number of candidates.
+      count (int): The number of picks to draw.
+      unselected (np.ndarray): The indices not yet picked in the current cycle.
+      previous (int): The index of the previous pick, or -1 if it is not a candidate.
+      rng (np.random.Generator): The random number generator.
+
+  Returns:
+      The picks and the indices left unselected in the cycle after the last pick.
+  """
+  # The selector starts a new cycle when only the previous pick is left
+  if len(unselected) == 1 and unselected[0] == previous:
+    unselected = unselected[:0]
+
+  head = rng.permutation(unselected)
+  _avoid_back_to_back(head[np.newaxis, :], previous, rng)
+  if count <= len(head):
+    return head[:count], head[count:]
+
+  remaining = count - len(head)
+  rows = -(-remaining // size)
+  cycles = rng.permuted(np.tile(np.arange(size), (rows, 1)), axis=1)
+  _avoid_back_to_back(cycles, head[-1] if len(head) else previous, rng)
+
+  used = remaining - (rows - 1) * size
+  picks = np.concatenate((head, cycles.ravel()[:remaining]))
+  return picks, cycles[-1, used:]
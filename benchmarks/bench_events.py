@@ -0,0 +1,92 @@
+"""Benchmark for events.py: delivery latency of picks as the number of subscribers grows.
+
+  python benchmarks/bench_events.py --subscribers 10 100 1000 5000 --events 200
+
+Every subscriber reads on its own thread, like an SSE connection of service.py
+does. One extra subscriber never reads, to show that a stalled client only
+fills its own bounded queue.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from events import EventBus  # noqa: E402
+
+
+def percentile(sorted_values, fraction):
+  return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def reader(subscription, sent, expected, latencies):
+  received = 0
+  while received < expected and not subscription.closed:
+    frames = subscription.get(1.0)
+    now = time.perf_counter()
+    for frame in frames:
+      # The frame id is the publish sequence number, which indexes the send times
+      sequence = int(frame[4:frame.index(b'\n')])
+      latencies.append(now - sent[sequence - 1])
+    received += len(frames)
+
+
+def run(subscribers, events, interval, policy, maxsize):
+  bus = EventBus(maxsize=maxsize, policy=policy, max_subscribers=subscribers + 1)
+  sent = []
+  latencies = [[] for _ in range(subscribers)]
+  threads = [
+    threading.Thread(target=reader, args=(bus.subscribe(), sent, events, latencies[i]), daemon=True)
+    for i in range(subscribers)
+  ]
+  stalled = bus.subscribe()
+  for thread in threads:
+    thread.start()
+
+  publish_times = []
+  for i in range(events):
+    # Each event is a pick of a different session, so nothing is coalesced away
+    data = {'session': str(i), 'team': 'killer', 'character': 'Nurse'}
+    start = time.perf_counter()
+    sent.append(start)
+    bus.publish('cycle', data, session=str(i))
+    publish_times.append(time.perf_counter() - start)
+    time.sleep(interval)
+  # Frames dropped from a full queue never arrive, so stop waiting for them eventually
+  deadline = time.monotonic() + 30
+  for thread in threads:
+    thread.join(timeout=max(0, deadline - time.monotonic()))
+  bus.close()
+  for thread in threads:
+    thread.join()
+
+  delivered = sorted(latency for values in latencies for latency in values)
+  publish_times.sort()
+  return delivered, publish_times, stalled.dropped
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--subscribers', type=int, nargs='+', default=[10, 100, 1000, 5000])
+  parser.add_argument('--events', type=int, default=200)
+  parser.add_argument('--interval', type=float, default=0.005, help='seconds between published events')
+  parser.add_argument('--policy', choices=['coalesce', 'drop'], default='coalesce')
+  parser.add_argument('--maxsize', type=int, default=64, help='queue size of each subscriber')
+  args = parser.parse_args()
+
+  print(f"{'subscribers':>11} {'delivered':>10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'publish p99 us':>15} {'stalled drops':>14}")
+  for subscribers in args.subscribers:
+    delivered, publish_times, dropped = run(
+      subscribers, args.events, args.interval, args.policy, args.maxsize)
+    if not delivered:
+      print(f"{subscribers:>11} {0:>10}")
+      continue
+    print(f"{subscribers:>11} {len(delivered):>10} "
+          f"{percentile(delivered, 0.5) * 1000:>8.3f} {percentile(delivered, 0.99) * 1000:>8.3f} "
+          f"{delivered[-1] * 1000:>8.3f} {percentile(publish_times, 0.99) * 1e6:>15.1f} {dropped:>14}")
+
+
+if __name__ == '__main__':
+  main()
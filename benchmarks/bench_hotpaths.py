@@ -0,0 +1,243 @@
+"""Benchmarks for the selector, config and command dispatch hot paths.
+
+Every case runs with a fixed seed, reports per-operation latency percentiles
+and memory use, and can be saved as a baseline or compared against one:
+
+  python benchmarks/bench_hotpaths.py --save-baseline
+  python benchmarks/bench_hotpaths.py              # compares with the baseline
+
+Timings are also stored relative to a fixed calibration loop, and the
+comparison uses those, so a baseline recorded on one machine stays usable on
+another. The calibration does not cover a change of interpreter, so the
+comparison warns when the baseline comes from another Python minor version.
+The saved baseline also records the commit it was measured at, to tell when
+it is stale.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import initialize_config, parse_list, configparser_instance  # noqa: E402
+from main import determine_input  # noqa: E402
+from selector import CharacterSelector  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+ROSTER_SIZES = (30, 1000, 10000, 100000)
+EXCLUSION_RATIOS = (0.0, 0.5)
+MODES = ('random', 'cycle')
+SEED = 1234
+
+
+def roster(size, prefix):
+  return [f'{prefix} {i}' for i in range(size)]
+
+
+def make_config(size):
+  return {
+    'team': False,
+    'mode': False,
+    'killers': roster(size, 'Killer'),
+    'survivors': roster(size, 'Survivor'),
+  }
+
+
+def operation_count(size):
+  # Keep every case to a similar amount of work, whatever the per-op cost
+  return max(50, min(2000, 2000000 // size))
+
+
+def calibrate(rounds=5):
+  '''Returns the fastest time in ns of a fixed pure Python loop, used to normalize timings between machines.'''
+  best = None
+  for _ in range(rounds):
+    start = time.perf_counter_ns()
+    total = 0
+    for i in range(200000):
+      total += i % 7
+    elapsed = time.perf_counter_ns() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best
+
+
+def percentile(sorted_values, fraction):
+  return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def measure(operation, count):
+  '''Runs operation count times, timing each call, then once more under tracemalloc for memory use.'''
+  timings = []
+  for _ in range(count):
+    start = time.perf_counter_ns()
+    operation()
+    timings.append(time.perf_counter_ns() - start)
+  timings.sort()
+
+  blocks = sys.getallocatedblocks()
+  tracemalloc.start()
+  baseline, _ = tracemalloc.get_traced_memory()
+  for _ in range(min(count, 200)):
+    operation()
+  _, peak = tracemalloc.get_traced_memory()
+  tracemalloc.stop()
+  retained_blocks = sys.getallocatedblocks() - blocks
+
+  return {
+    'ops': count,
+    'mean_ns': sum(timings) / count,
+    'p50_ns': percentile(timings, 0.5),
+    'p90_ns': percentile(timings, 0.9),
+    'p99_ns': percentile(timings, 0.99),
+    'peak_bytes': peak - baseline,
+    'retained_blocks': retained_blocks,
+  }
+
+
+def selector_cases(sizes):
+  for size in sizes:
+    for ratio in EXCLUSION_RATIOS:
+      for mode in MODES:
+
+        def setup(size=size, ratio=ratio, mode=mode):
+          random.seed(SEED)
+          selector = CharacterSelector(make_config(size))
+          for character in random.sample(sorted(selector.config_characters['killer']), int(size * ratio)):
+            selector.exclude_character('killer', character)
+          return lambda: selector.pick('killer', mode)
+
+        yield f'selector.pick[{mode},size={size},excluded={ratio}]', setup, operation_count(size)
+
+
+def config_cases(sizes, directory):
+  for size in sizes:
+    path = os.path.join(directory, f'settings_{size}.ini')
+    with open(path, 'w') as f:
+      f.write('[Settings]\nteam = 0\nmode = 0\n')
+      f.write(f"killers = {','.join(roster(size, 'Killer'))}\n")
+      f.write(f"survivors = {','.join(roster(size, 'Survivor'))}\n")
+    count = max(20, min(500, 200000 // size))
+
+    def setup_initialize(path=path):
+      return lambda: initialize_config(path)
+
+    def setup_parse(path=path):
+      config = configparser_instance()
+      config.read(path)
+      return lambda: parse_list(config, 'killers', list)
+
+    yield f'config.initialize_config[size={size}]', setup_initialize, count
+    yield f'config.parse_list[size={size}]', setup_parse, count
+
+
+def dispatch_cases():
+  choices = ['', '0', '1', 'm', 'mode', 'exit', 'remove', 'clear', 'menu', 'nonsense']
+
+  def setup():
+    state = {'i': 0}
+
+    def operation():
+      determine_input(choices[state['i'] % len(choices)])
+      state['i'] += 1
+
+    return operation
+
+  yield 'main.determine_input', setup, 20000
+
+
+def run(sizes, match):
+  results = {}
+  with tempfile.TemporaryDirectory() as directory:
+    cases = [*selector_cases(sizes), *config_cases(sizes, directory), *dispatch_cases()]
+    for name, setup, count in cases:
+      if match and match not in name:
+        continue
+      operation = setup()
+      for _ in range(min(count, 20)):
+        operation()
+      results[name] = measure(operation, count)
+      print(f"{name:55} p50 {results[name]['p50_ns'] / 1000:10.2f} us"
+            f"  p99 {results[name]['p99_ns'] / 1000:10.2f} us"
+            f"  peak {results[name]['peak_bytes']:>10} B")
+  return results
+
+
+def current_commit():
+  '''Returns the abbreviated commit of the working tree, or None outside a git checkout.'''
+  try:
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                          text=True, check=True).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def compare(results, calibration, baseline, threshold):
+  '''Prints cases whose normalized p50 got slower than threshold times the baseline. Returns the regressions.'''
+  recorded = baseline.get('python', '')
+  if recorded.split('.')[:2] != sys.version.split()[0].split('.')[:2]:
+    print(f"Warning: the baseline was recorded on Python {recorded or 'unknown'}, this is Python {sys.version.split()[0]}."
+          " Interpreter changes are not calibrated out.")
+  regressions = []
+  for name, result in results.items():
+    previous = baseline['results'].get(name)
+    if previous is None:
+      continue
+    current = result['p50_ns'] / calibration
+    before = previous['p50_ns'] / baseline['calibration_ns']
+    ratio = current / before if before else 1.0
+    if ratio > threshold:
+      regressions.append(name)
+      print(f'REGRESSION {name}: {ratio:.2f}x the baseline p50')
+  return regressions
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--sizes', type=int, nargs='+', default=list(ROSTER_SIZES))
+  parser.add_argument('--match', help='only run cases whose name contains this text')
+  parser.add_argument('--baseline', default=BASELINE_PATH)
+  parser.add_argument('--save-baseline', action='store_true')
+  parser.add_argument('--output', help='also write the results of this run to a JSON file')
+  parser.add_argument('--threshold', type=float, default=1.5,
+                      help='slowdown factor of the normalized p50 that counts as a regression')
+  args = parser.parse_args()
+
+  calibration = calibrate()
+  results = run(args.sizes, args.match)
+  report = {
+    'seed': SEED,
+    'python': sys.version.split()[0],
+    'commit': current_commit(),
+    'calibration_ns': calibration,
+    'results': results,
+  }
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(report, f, indent=2)
+  if args.save_baseline:
+    with open(args.baseline, 'w') as f:
+      json.dump(report, f, indent=2)
+    print(f'Saved baseline to {args.baseline}')
+    return
+
+  try:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+  except FileNotFoundError:
+    print('No baseline to compare with. Run with --save-baseline first.')
+    return
+  if compare(results, calibration, baseline, args.threshold):
+    sys.exit(1)
+  print('No regressions against the baseline.')
+
+
+if __name__ == '__main__':
+  main()
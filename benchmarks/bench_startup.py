@@ -0,0 +1,146 @@
+"""Startup benchmark: what a fresh process pays before it answers one command.
+
+  python benchmarks/bench_startup.py --runs 20
+
+Prints the slowest imports of main.py as measured by `python -X importtime`, then
+the median wall-clock time of fresh interpreters that import selector, import
+main, and run one batch pick, each minus the time of an interpreter that does
+nothing. The cases run on a copy of the modules, settings.ini and loadouts.json
+in a temporary directory, so the picks they make never reach the real state
+and history files. Exits with status 1 if an overhead is over its budget, or if importing
+main or selector loads modules or touches files that only commands need.
+"""
+import argparse
+import compileall
+import glob
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The temporary directory the cases run in, set by main
+WORK = None
+# Files copied into the directory the cases run in
+FILES = ('*.py', 'settings.ini', 'loadouts.json')
+
+# Milliseconds each case may add to a bare interpreter start
+BUDGETS_MS = {
+  'import selector': 15.0,
+  'import main': 25.0,
+  'main.py --batch pick': 60.0,
+}
+# Modules that only parsing the configuration file, the batch output, the history or instrumentation need
+DEFERRED_MODULES = ('configparser', 'json', 'argparse', 'numpy', 'history', 'loadout', 'state', 'metrics')
+
+CASES = {
+  'python': ([sys.executable, '-c', 'pass'], None),
+  'import selector': ([sys.executable, '-c', 'import selector'], None),
+  'import main': ([sys.executable, '-c', 'import main'], None),
+  'main.py --batch pick': ([sys.executable, 'main.py', '--batch'], b'pick\n'),
+}
+
+
+def importtime(statement):
+  """Returns (self_us, cumulative_us, module) for every import of a statement in a fresh interpreter."""
+  result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                          cwd=WORK, capture_output=True, check=True)
+  imports = []
+  for line in result.stderr.decode().splitlines():
+    if not line.startswith('import time:') or 'self [us]' in line:
+      continue
+    self_us, cumulative_us, module = line[len('import time:'):].split('|')
+    imports.append((int(self_us), int(cumulative_us), module.rstrip()))
+  return imports
+
+
+def loaded_modules(statement):
+  result = subprocess.run([sys.executable, '-c', f'import sys; {statement}; print(" ".join(sys.modules))'],
+                          cwd=WORK, capture_output=True, check=True)
+  return set(result.stdout.decode().split())
+
+
+def snapshot_files():
+  return {
+    name: os.stat(os.path.join(WORK, name)).st_mtime_ns
+    for name in os.listdir(WORK) if name != '__pycache__'
+  }
+
+
+def wall_clock(command, stdin, runs):
+  times = []
+  for _ in range(runs):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=WORK, input=stdin, stdout=subprocess.DEVNULL, check=True)
+    times.append(time.perf_counter() - start)
+  return statistics.median(times) * 1000
+
+
+def copy_tree(work):
+  for pattern in FILES:
+    for path in glob.glob(os.path.join(ROOT, pattern)):
+      shutil.copy2(path, work)
+
+
+def main():
+  global WORK
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--runs', type=int, default=20, help='fresh processes per case')
+  parser.add_argument('--top', type=int, default=15, help='number of imports to list')
+  args = parser.parse_args()
+  WORK = tempfile.mkdtemp(prefix='bench_startup_')
+  try:
+    copy_tree(WORK)
+    failed = run(args)
+  finally:
+    shutil.rmtree(WORK, ignore_errors=True)
+  sys.exit(1 if failed else 0)
+
+
+def run(args):
+  failed = False
+
+  # Warm the bytecode and configuration caches so every case measures a warm start,
+  # even where PYTHONDONTWRITEBYTECODE keeps the interpreter from writing bytecode itself
+  compileall.compile_dir(WORK, maxlevels=0, quiet=1)
+  for command, stdin in CASES.values():
+    subprocess.run(command, cwd=WORK, input=stdin, stdout=subprocess.DEVNULL, check=True)
+
+  imports = importtime('import main')
+  print(f"Slowest imports of main.py ({sum(i[0] for i in imports) / 1000:.1f} ms in total):")
+  print(f"{'self ms':>8} {'cumulative ms':>14}  module")
+  for self_us, cumulative_us, module in sorted(imports, key=lambda i: -i[1])[:args.top]:
+    print(f"{self_us / 1000:>8.2f} {cumulative_us / 1000:>14.2f}  {module}")
+
+  print()
+  for statement in ('import selector', 'import main'):
+    before = snapshot_files()
+    loaded = loaded_modules(statement)
+    changed = sorted(name for name, mtime in snapshot_files().items() if before.get(name) != mtime)
+    deferred = sorted(name for name in DEFERRED_MODULES if name in loaded)
+    if statement == 'import selector' and 'config' in loaded:
+      deferred.append('config')
+    if deferred or changed:
+      failed = True
+      print(f"FAIL: {statement} loaded {deferred or 'nothing deferred'} and changed {changed or 'no files'}")
+    else:
+      print(f"ok: {statement} loads no deferred modules and touches no files")
+
+  print()
+  baseline = wall_clock(*CASES['python'], args.runs)
+  print(f"{'case':<22} {'median ms':>10} {'overhead ms':>12} {'budget ms':>10}")
+  print(f"{'python':<22} {baseline:>10.1f}")
+  for name, budget in BUDGETS_MS.items():
+    elapsed = wall_clock(*CASES[name], args.runs)
+    overhead = elapsed - baseline
+    over = overhead > budget
+    failed |= over
+    print(f"{name:<22} {elapsed:>10.1f} {overhead:>12.1f} {budget:>10.1f}{'  OVER BUDGET' if over else ''}")
+  return failed
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,72 @@
+"""Load test for party.py: many lobbies drawing concurrently on one asyncio event loop.
+
+  python benchmarks/loadtest_party.py --lobbies 5000 --clients 200 --draws 50
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import get_config_file_path, load_config  # noqa: E402
+from party import LobbyManager  # noqa: E402
+
+TARGET_P99_MS = 1.0
+
+
+def percentile(sorted_values, fraction):
+  return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def client(manager, lobby_ids, draws, mode, rng, latencies):
+  for _ in range(draws):
+    lobby_id = lobby_ids[rng.randrange(len(lobby_ids))]
+    start = time.perf_counter()
+    await manager.draw(lobby_id, mode)
+    latencies.append(time.perf_counter() - start)
+    # Let the other clients run between draws, as network handlers would
+    await asyncio.sleep(0)
+
+
+async def run(args):
+  rng = random.Random(args.seed)
+  manager = LobbyManager(load_config(get_config_file_path('settings.ini')), rng=rng)
+  lobby_ids = [
+    manager.create([f'lobby{i}-survivor{j}' for j in range(4)], killer=f'lobby{i}-killer' if args.killer else None)
+    for i in range(args.lobbies)
+  ]
+  latencies = []
+  start = time.perf_counter()
+  await asyncio.gather(*(
+    client(manager, lobby_ids, args.draws, args.mode, random.Random(rng.random()), latencies)
+    for _ in range(args.clients)
+  ))
+  return latencies, time.perf_counter() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--lobbies', type=int, default=5000)
+  parser.add_argument('--clients', type=int, default=200, help='concurrent coroutines drawing for random lobbies')
+  parser.add_argument('--draws', type=int, default=50, help='draws per client')
+  parser.add_argument('--mode', choices=['random', 'cycle'], default='cycle')
+  parser.add_argument('--killer', action='store_true', help='give every lobby a killer player as well')
+  parser.add_argument('--seed', type=int, default=1234)
+  args = parser.parse_args()
+
+  latencies, elapsed = asyncio.run(run(args))
+  latencies.sort()
+  p99 = percentile(latencies, 0.99) * 1000
+  print(f'{len(latencies)} draws over {args.lobbies} lobbies with {args.clients} clients in {elapsed:.2f}s')
+  print(f'throughput: {len(latencies) / elapsed:.0f} draws/sec')
+  for label, fraction in (('p50', 0.5), ('p90', 0.9)):
+    print(f'{label}: {percentile(latencies, fraction) * 1000:.3f} ms')
+  print(f'p99: {p99:.3f} ms ({"within" if p99 < TARGET_P99_MS else "over"} the {TARGET_P99_MS} ms target)')
+  sys.exit(0 if p99 < TARGET_P99_MS else 1)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,86 @@
+"""Load test for service.py: many sessions picking concurrently against a local server.
+
+Start the server with `python service.py` and run `python benchmarks/loadtest_service.py`,
+or pass --serve to start one in this process first.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def serve(host, port, threads):
+  from config import initialize_config
+  from service import PooledWSGIServer, SessionStore, create_app
+
+  # Per-request access logging would dominate the measurement
+  logging.getLogger('werkzeug').setLevel(logging.ERROR)
+  store = SessionStore(initialize_config('settings.ini'))
+  server = PooledWSGIServer(host, port, create_app(store), threads=threads)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+
+def percentile(sorted_values, fraction):
+  return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def run_worker(http, url, session_ids, picks):
+  latencies = []
+  body = json.dumps({'team': 'killer'}).encode()
+  headers = {'Content-Type': 'application/json'}
+  for i in range(picks):
+    session_id = session_ids[i % len(session_ids)]
+    start = time.perf_counter()
+    response = http.request('POST', f'{url}/sessions/{session_id}/pick', body=body, headers=headers)
+    latencies.append(time.perf_counter() - start)
+    if response.status != 200:
+      raise RuntimeError(f'Pick failed with status {response.status}: {response.data!r}')
+  return latencies
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--url', default='http://127.0.0.1:5000')
+  parser.add_argument('--serve', action='store_true', help='start a server in this process')
+  parser.add_argument('--sessions', type=int, default=1000)
+  parser.add_argument('--threads', type=int, default=32)
+  parser.add_argument('--picks', type=int, default=500, help='picks per thread')
+  parser.add_argument('--server-threads', type=int, default=64, help='worker threads of the server started by --serve')
+  args = parser.parse_args()
+
+  if args.serve:
+    host, port = urllib3.util.parse_url(args.url).host, urllib3.util.parse_url(args.url).port or 80
+    serve(host, port, args.server_threads)
+
+  http = urllib3.PoolManager(maxsize=args.threads)
+  session_ids = [
+    json.loads(http.request('POST', f'{args.url}/sessions').data)['session']
+    for _ in range(args.sessions)
+  ]
+  # Spread the sessions over the threads so no two threads contend for one session lock
+  shards = [session_ids[i::args.threads] or session_ids for i in range(args.threads)]
+
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=args.threads) as executor:
+    results = list(executor.map(lambda shard: run_worker(http, args.url, shard, args.picks), shards))
+  elapsed = time.perf_counter() - start
+
+  latencies = sorted(latency for result in results for latency in result)
+  print(f'{len(latencies)} picks over {args.sessions} sessions with {args.threads} threads in {elapsed:.2f}s')
+  print(f'throughput: {len(latencies) / elapsed:.0f} picks/sec')
+  for label, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+    print(f'{label}: {percentile(latencies, fraction) * 1000:.2f} ms')
+  print(f"server: {json.loads(http.request('GET', f'{args.url}/stats').data)}")
+
+
+if __name__ == '__main__':
+  main()
@@ -1,6 +1,7 @@
 import os
 import sys
-import configparser
+import marshal
+import threading
 
 
 def default_killers():
@@ -24,6 +25,8 @@ def default_survivors():
 
 
 def configparser_instance():
+  # configparser is only imported when a file has to be parsed, warm starts read the marshal cache instead
+  import configparser
   # create a new instance of the ConfigParser class from the configparser module
   return configparser.ConfigParser(allow_no_value=True)
 
@@ -31,6 +34,7 @@ def configparser_instance():
 def get_config_file_path(config_file):
   # get the directory name of the current file
   dir_name = os.path.dirname(os.path.abspath(__file__))
+  # relative paths are resolved against this directory whatever the working directory is, absolute paths are kept
   return os.path.join(dir_name, config_file)
 
 
@@ -38,24 +42,52 @@ def create_config(config_file):
   config = configparser_instance()
   config.add_section('Settings')
 
-  config.set('Settings', 'team', 0)
+  config.set('Settings', 'team', '0')
   config.set('Settings',
              '# Default team selection: 0 = killer, 1 = survivor\n', None)
 
-  config.set('Settings', 'mode', 0)
+  config.set('Settings', 'mode', '0')
   config.set('Settings',
              '# Default mode selection: 0 = rotating, 1 = normal\n', None)
 
-  config.set('Settings', 'killerList', ','.join(default_killers()))
+  config.set('Settings', 'killers', ','.join(default_killers()))
   config.set('Settings',
              '# Default list of Killers. NO SPACES BETWEEN COMMAS\n', None)
 
-  config.set('Settings', 'survivorList', ','.join(default_survivors()))
+  config.set('Settings', 'survivors', ','.join(default_survivors()))
   config.set('Settings',
              '# Default list of Survivors. NO SPACES BETWEEN COMMAS', None)
 
+  config.set('Settings', 'killerWeights', '')
+  config.set('Settings', 'survivorWeights', '')
+  config.set('Settings',
+             '# Optional pick weights for normal mode as Name:weight pairs. Unlisted characters weigh 1\n', None)
+
+  config.set('Settings', 'stateFile', 'selector_state')
+  config.set('Settings',
+             '# Base name of the files that keep rotation progress between runs\n', None)
+
+  config.set('Settings', 'fsync', 'interval')
+  config.set('Settings',
+             '# When picks are synced to disk: always, interval or never\n', None)
+
+  config.set('Settings', 'historyFile', 'pick_history')
+  config.set('Settings',
+             '# Base name of the files that keep every pick for the history command\n', None)
+
+  config.set('Settings', 'loadoutFile', 'loadouts.json')
+  config.set('Settings', 'loadoutExclusions', '')
+  config.set('Settings',
+             '# Perk, add-on, item and offering data for random builds, and names never to use in them.\n'
+             '# The bundled loadouts.json only has killer add-ons for Trapper, Wraith and Nurse\n', None)
+
+  config.set('Settings', 'metricsFile', '')
+  config.set('Settings',
+             '# File to write latency histograms and pick counters to at exit (.json or Prometheus text). Empty turns them off', None)
+
   with open(get_config_file_path(config_file), 'w') as f:
     config.write(f)
+  return config
 
 
 def parse_boolean(config, key):
@@ -81,8 +113,92 @@ def parse_list(config, name, default_fn):
   return list
 
 
+def parse_names(config, name):
+  list_as_string = config.get('Settings', name, fallback='')
+  return [i.strip() for i in list_as_string.split(',') if i.strip()]
+
+
+def parse_weights(config, name):
+  weights = {}
+  list_as_string = config.get('Settings', name, fallback='')
+  for entry in list_as_string.split(','):
+    if entry == '':
+      continue
+    character, _, weight = entry.rpartition(':')
+    try:
+      weight = float(weight)
+      if character == '' or weight < 0:
+        raise ValueError
+    except ValueError:
+      print(
+        f"Warning: Invalid weight '{entry}' for '{name}' in configuration file. Ignoring it.\n"
+      )
+      continue
+    weights[character] = weight
+  return weights
+
+
+def parse_presets(config):
+  presets = {}
+  if not config.has_section('Presets'):
+    return presets
+  for name, value in config.items('Presets'):
+    if value is None or name in config.defaults():
+      continue
+    kind, _, list_as_string = value.partition(':')
+    kind = kind.split()
+    only = kind[:1] == ['only']
+    team = kind[-1] if kind else ''
+    if team not in ('killer', 'survivor') or len(kind) != 1 + only:
+      print(
+        f"Warning: Invalid preset '{name}' in configuration file. Ignoring it.\n"
+      )
+      continue
+    presets[name] = {
+      "team": team,
+      "only": only,
+      "characters": [i.strip() for i in list_as_string.split(',') if i.strip()]
+    }
+  return presets
+
+
+def parse_choice(config, name, choices, default):
+  value = config.get('Settings', name, fallback=default)
+  if value not in choices:
+    print(
+      f"Warning: Invalid value for '{name}' in configuration file. Using default value {default}.\n"
+    )
+    value = default
+  return value
+
+
+def read_config(config_file):
+  """
+  Parses a configuration file without any of the fallbacks of initialize_config.
+
+  Used to reload a file that is being edited, which may be cut short or
+  broken only for a moment, so nothing is rewritten and the process is never
+  exited here.
+
+  Raises:
+      ValueError: If the file cannot be read or parsed, or has no 'Settings' section.
+  """
+  import configparser
+  config = configparser_instance()
+  try:
+    with open(get_config_file_path(config_file)) as f:
+      config.read_file(f)
+    config.get('Settings', 'team')
+  except (OSError, configparser.Error) as e:
+    raise ValueError(str(e)) from None
+  return parse_config(config)
+
+
 def initialize_config(config_file):
+  import configparser
   config = configparser_instance()
+  # read the same file create_config writes, not one relative to the working directory
+  config_file = get_config_file_path(config_file)
 
   try:
     with open(config_file) as f:
@@ -90,29 +206,186 @@ def initialize_config(config_file):
       config.get('Settings', 'team')
   except FileNotFoundError:
     print("Configuration file not found. Creating default config.\n")
-    create_config(config_file)
-    with open(config_file) as f:
-      config.read_file(f)
+    config = create_config(config_file)
   except configparser.NoSectionError:
     print(
       "Invalid configuration file: 'Settings' section not found. Creating default config\n"
     )
-    create_config(config_file)
-    with open(config_file) as f:
-      config.read_file(f)
+    config = create_config(config_file)
   except Exception as e:
     print(f"Unexpected error while reading configuration file: {e}\n")
     sys.exit(1)
+  return parse_config(config)
+
 
+def parse_config(config):
+  """Returns the configuration settings of a parsed ConfigParser as a dictionary."""
   mode = parse_boolean(config, 'mode')
   team = parse_boolean(config, 'team')
   killers = parse_list(config, 'killers', default_killers)
   survivors = parse_list(config, 'survivors', default_survivors)
+  killer_weights = parse_weights(config, 'killerWeights')
+  survivor_weights = parse_weights(config, 'survivorWeights')
+  presets = parse_presets(config)
+  state_file = config.get('Settings', 'stateFile', fallback='selector_state')
+  fsync = parse_choice(config, 'fsync', ['always', 'interval', 'never'], 'interval')
+  history_file = config.get('Settings', 'historyFile', fallback='pick_history')
+  loadout_file = config.get('Settings', 'loadoutFile', fallback='loadouts.json')
+  loadout_exclusions = parse_names(config, 'loadoutExclusions')
+  metrics_file = config.get('Settings', 'metricsFile', fallback='')
 
   # create a dictionary with the configuration settings
   return {
     "team": team,
     "mode": mode,
     "killers": killers,
-    "survivors": survivors
+    "survivors": survivors,
+    "killer_weights": killer_weights,
+    "survivor_weights": survivor_weights,
+    "presets": presets,
+    "state_file": state_file,
+    "fsync": fsync,
+    "history_file": history_file,
+    "loadout_file": loadout_file,
+    "loadout_exclusions": loadout_exclusions,
+    "metrics_file": metrics_file
   }
+
+
+# Parsed configurations by path, each stored with the (mtime, size) of the file it was parsed from
+_config_cache = {}
+# The format of the cache file. Bump it whenever parse_config returns different keys,
+# so caches written by an older version are parsed again instead of lacking the new keys
+CACHE_VERSION = 2
+
+
+def get_cache_file_path(config_file):
+  return config_file + '.cache'
+
+
+def _file_key(config_file):
+  stat = os.stat(config_file)
+  return [stat.st_mtime_ns, stat.st_size]
+
+
+def load_config(config_file, strict=False):
+  """
+  Returns the configuration settings, parsing the file only when it changed.
+
+  A parsed configuration is kept in memory and written next to the file in
+  marshal format, both keyed on the file's modification time and size. Warm
+  starts read the cache instead of running configparser, and marshal is built
+  into the interpreter, so they import neither configparser nor json. The
+  returned dictionary is shared between callers and must not be modified.
+  Relative paths are resolved like get_config_file_path does.
+
+  Args:
+      config_file (str): The configuration file.
+      strict (bool): Parse the file with read_config, raising ValueError when
+          it is broken, instead of falling back to a default configuration.
+  """
+  config_file = get_config_file_path(config_file)
+  try:
+    key = _file_key(config_file)
+  except FileNotFoundError:
+    key = None
+
+  cached = _config_cache.get(config_file)
+  if cached is not None and cached[0] == key:
+    return cached[1]
+
+  config = None
+  if key is not None:
+    try:
+      with open(get_cache_file_path(config_file), 'rb') as f:
+        serialized = marshal.load(f)
+      if serialized['version'] == CACHE_VERSION and serialized['key'] == key:
+        config = serialized['config']
+    except (OSError, ValueError, EOFError, TypeError, KeyError):
+      pass
+
+  if config is None:
+    # The key stays the one taken before parsing, so an edit saved while the file
+    # was parsed does not match it and is parsed on the next call
+    config = read_config(config_file) if strict else initialize_config(config_file)
+    try:
+      if key is None:
+        key = _file_key(config_file)
+      with open(get_cache_file_path(config_file), 'wb') as f:
+        marshal.dump({'version': CACHE_VERSION, 'key': key, 'config': config}, f)
+    except OSError:
+      # The cache is only an optimization, so a read-only directory is fine
+      pass
+
+  _config_cache[config_file] = (key, config)
+  return config
+
+
+# The ConfigWatcher class pushes roster changes in the configuration file into a live CharacterSelector.
+class ConfigWatcher:
+
+  def __init__(self, config_file, selector, lock=None) -> None:
+    """
+    Initializes the ConfigWatcher.
+
+    Args:
+        config_file (str): The configuration file to watch.
+        selector (CharacterSelector): The selector that receives roster changes.
+        lock (threading.Lock): A lock held while the selector is updated, for
+            when the watcher runs on its own thread next to code that picks.
+    """
+    self.config_file = get_config_file_path(config_file)
+    self.selector = selector
+    self.lock = lock or threading.Lock()
+    self._stop = threading.Event()
+    self._thread = None
+    self._failed_key = None
+    try:
+      self._key = _file_key(self.config_file)
+    except FileNotFoundError:
+      self._key = None
+
+  def poll(self) -> bool:
+    """
+    Reloads the rosters, presets and weights if the file changed since the last poll. Returns True if it did.
+
+    A file that cannot be parsed, e.g. one saved halfway through an edit, is
+    reported once and leaves the current roster in place. It is retried on
+    every poll until it parses.
+    """
+    try:
+      key = _file_key(self.config_file)
+    except FileNotFoundError:
+      return False
+    if key == self._key:
+      return False
+    try:
+      config = load_config(self.config_file, strict=True)
+    except ValueError as e:
+      if key != self._failed_key:
+        self._failed_key = key
+        print(f"Warning: Could not reload the configuration file: {e}. Keeping the current roster.\n")
+      return False
+    self._key = key
+    with self.lock:
+      for team, characters in (('killer', config['killers']), ('survivor', config['survivors'])):
+        if self.selector.update_roster(team, characters):
+          print(f"Warning: The {team} exclusions would leave too few characters of the new roster. Clearing them.\n")
+        self.selector.update_presets(team, config['presets'])
+        self.selector.update_weights(team, config[f'{team}_weights'])
+    return True
+
+  def start(self, interval=1.0) -> None:
+    '''Polls the file every interval seconds on a background thread.'''
+
+    def run():
+      while not self._stop.wait(interval):
+        self.poll()
+
+    self._thread = threading.Thread(target=run, daemon=True)
+    self._thread.start()
+
+  def stop(self) -> None:
+    self._stop.set()
+    if self._thread is not None:
+      self._thread.join()
@@ -0,0 +1,198 @@
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+POLICIES = ('coalesce', 'drop')
+# Pick events of one session and team replace each other in a coalescing queue
+PICK_EVENTS = ('random', 'cycle', 'batch')
+
+# The most events the dispatcher hands to subscribers at once
+MAX_BATCH = 256
+
+_STOP = object()
+
+
+# The Subscription class is one subscriber's bounded queue of pending Server-Sent Events frames.
+class Subscription:
+
+  def __init__(self, maxsize: int = 256, policy: str = 'coalesce', session: str = None) -> None:
+    """
+    Initializes the Subscription.
+
+    The publishing side never waits on a subscription. When the queue is
+    full the oldest frame is dropped, and with the 'coalesce' policy a new
+    pick first replaces a pending pick of the same session and team, so a
+    slow subscriber still ends up with the latest pick of everything.
+
+    Args:
+        maxsize (int): The maximum number of pending frames.
+        policy (str): 'coalesce' or 'drop'.
+        session (str): Only receive events of this session. Defaults to every session.
+
+    Attributes:
+        dropped (int): The number of frames dropped or replaced before they were read.
+    """
+    if policy not in POLICIES:
+      raise ValueError(f"Invalid subscription policy: {policy}")
+    self.maxsize = maxsize
+    self.policy = policy
+    self.session = session
+    self.dropped = 0
+    self.closed = False
+    self._pending = OrderedDict()
+    self._sequence = 0
+    self._ready = threading.Condition(threading.Lock())
+
+  def put(self, items) -> None:
+    '''Queues (key, frame) pairs without blocking. A key of None is never coalesced.'''
+    with self._ready:
+      pending = self._pending
+      for key, frame in items:
+        if self.policy == 'coalesce' and key is not None and key in pending:
+          # Keep the frame's place in line so a busy key cannot starve the others
+          pending[key] = frame
+          self.dropped += 1
+          continue
+        if len(pending) >= self.maxsize:
+          pending.popitem(last=False)
+          self.dropped += 1
+        if key is None or self.policy == 'drop':
+          # Unique keys keep every frame apart
+          self._sequence += 1
+          key = self._sequence
+        pending[key] = frame
+      self._ready.notify()
+
+  def get(self, timeout: float = None) -> list:
+    '''Returns every pending frame, waiting up to timeout seconds for one. Returns [] on timeout or once closed.'''
+    with self._ready:
+      if not self._pending and not self.closed:
+        self._ready.wait(timeout)
+      frames = list(self._pending.values())
+      self._pending.clear()
+      return frames
+
+  def close(self) -> None:
+    with self._ready:
+      self.closed = True
+      self._ready.notify()
+
+
+# The EventBus class fans selector events out to many subscribers from a dispatcher thread.
+class EventBus:
+
+  def __init__(self, maxsize: int = 256, policy: str = 'coalesce', max_subscribers: int = 10000) -> None:
+    """
+    Initializes the EventBus.
+
+    Publishing only appends the event to an inbox, so a pick never waits for
+    subscribers however many there are. A dispatcher thread encodes each event
+    as a Server-Sent Events frame once and hands the same bytes to every
+    subscription, and events that arrived together are handed over together.
+
+    Args:
+        maxsize (int): The default queue size of a subscription.
+        policy (str): The default policy of a subscription, 'coalesce' or 'drop'.
+        max_subscribers (int): The maximum number of subscriptions at once.
+    """
+    if policy not in POLICIES:
+      raise ValueError(f"Invalid subscription policy: {policy}")
+    self.maxsize = maxsize
+    self.policy = policy
+    self.max_subscribers = max_subscribers
+    self.sequence = 0
+    # Replaced rather than modified, so the dispatcher can iterate it without a lock
+    self._subscriptions = ()
+    self._lock = threading.Lock()
+    self._inbox = queue.SimpleQueue()
+    self._thread = None
+
+  def __len__(self) -> int:
+    return len(self._subscriptions)
+
+  def subscribe(self, maxsize: int = None, policy: str = None, session: str = None) -> Subscription:
+    """
+    Adds a subscription.
+
+    Raises:
+        OverflowError: If max_subscribers subscriptions already exist.
+    """
+    subscription = Subscription(maxsize or self.maxsize, policy or self.policy, session)
+    with self._lock:
+      if len(self._subscriptions) >= self.max_subscribers:
+        raise OverflowError('Too many subscribers')
+      self._subscriptions = self._subscriptions + (subscription,)
+      self._start()
+    return subscription
+
+  def unsubscribe(self, subscription: Subscription) -> None:
+    subscription.close()
+    with self._lock:
+      self._subscriptions = tuple(i for i in self._subscriptions if i is not subscription)
+
+  def publish(self, event: str, data: dict, session: str = None) -> None:
+    '''Queues an event for every subscriber without blocking. Events published with no subscribers are discarded.'''
+    if self._subscriptions:
+      self._inbox.put((event, data, session))
+
+  def listener(self, session: str = None):
+    '''Returns a selector listener that publishes every selector event of a session.'''
+
+    def publish(event, team, character=None):
+      if not self._subscriptions:
+        return
+      self._inbox.put((event, {
+        'session': session,
+        'team': team,
+        'character': character,
+        'time': time.time()
+      }, session))
+
+    return publish
+
+  def _start(self) -> None:
+    if self._thread is None:
+      self._thread = threading.Thread(target=self._dispatch, daemon=True)
+      self._thread.start()
+
+  def _dispatch(self) -> None:
+    while True:
+      batch = [self._inbox.get()]
+      # Take whatever else arrived meanwhile, so subscribers are woken once per batch
+      while len(batch) < MAX_BATCH:
+        try:
+          batch.append(self._inbox.get_nowait())
+        except queue.Empty:
+          break
+      if any(item is _STOP for item in batch):
+        return
+      subscriptions = self._subscriptions
+      if not subscriptions:
+        continue
+      items = []
+      for event, data, session in batch:
+        self.sequence += 1
+        frame = f"id: {self.sequence}\nevent: {event}\ndata: {json.dumps(data)}\n\n".encode()
+        key = (session, data.get('team')) if event in PICK_EVENTS else None
+        items.append((session, key, frame))
+      everything = [(key, frame) for _, key, frame in items]
+      for subscription in subscriptions:
+        if subscription.session is None:
+          subscription.put(everything)
+        else:
+          own = [(key, frame) for session, key, frame in items if session == subscription.session]
+          if own:
+            subscription.put(own)
+
+  def close(self) -> None:
+    '''Stops the dispatcher and closes every subscription.'''
+    with self._lock:
+      subscriptions, self._subscriptions = self._subscriptions, ()
+      thread, self._thread = self._thread, None
+    if thread is not None:
+      self._inbox.put(_STOP)
+      thread.join()
+    for subscription in subscriptions:
+      subscription.close()
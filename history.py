@@ -0,0 +1,254 @@
+import json
+import mmap
+import os
+import struct
+import time
+
+TEAMS = ('killer', 'survivor')
+MODES = ('random', 'cycle')
+
+MAGIC = b'DBDPICK\x02'
+# The header is the magic number and the record size, padded to one record
+HEADER = struct.Struct('<8sI4x')
+# A record is the time in seconds since the epoch, the team, the mode and the character id, padded to 16 bytes.
+# The id is 32 bits wide like the 'I' pool typecode, so every roster a selector takes fits
+RECORD = struct.Struct('<dBB2xI')
+# Version 1 files stored the character id in 16 bits. They are converted when they are first opened
+MAGIC_V1 = b'DBDPICK\x01'
+RECORD_V1 = struct.Struct('<dBBH4x')
+SECONDS_PER_DAY = 86400
+
+
+def record_dtype():
+  '''Returns the NumPy structured dtype of a record, matching RECORD.'''
+  import numpy as np
+  return np.dtype({
+    'names': ['time', 'team', 'mode', 'character'],
+    'formats': ['<f8', 'u1', 'u1', '<u4'],
+    'offsets': [0, 8, 9, 12],
+    'itemsize': RECORD.size
+  })
+
+
+# The HistoryLog class keeps every pick in a fixed-width binary file and answers aggregate queries over it.
+class HistoryLog:
+
+  def __init__(self, path: str, buffer_size: int = 64 * 1024) -> None:
+    """
+    Initializes the HistoryLog.
+
+    Picks are appended to '<path>.history' as fixed-width records, so queries
+    map the file and read it as a NumPy structured array without parsing
+    anything. Characters are stored as ids into the name table kept in
+    '<path>.names', which only ever grows, so roster edits never change the
+    meaning of older records.
+
+    Args:
+        path (str): The base path of the history and name files.
+        buffer_size (int): The size of the write buffer in bytes.
+
+    Attributes:
+        names (dict): The character name of each id, per team.
+    """
+    self.history_path = path + '.history'
+    self.names_path = path + '.names'
+    self.buffer_size = buffer_size
+    self.names = {team: [] for team in TEAMS}
+    self._ids = {team: {} for team in TEAMS}
+    self._file = None
+    try:
+      with open(self.names_path) as f:
+        names = json.load(f)
+      for team in TEAMS:
+        for name in names.get(team, []):
+          self._intern(team, name)
+    except FileNotFoundError:
+      pass
+
+  def _intern(self, team: str, character: str) -> int:
+    ids = self._ids[team]
+    character_id = ids.get(character)
+    if character_id is None:
+      character_id = ids[character] = len(self.names[team])
+      self.names[team].append(character)
+    return character_id
+
+  def _save_names(self) -> None:
+    temporary_path = self.names_path + '.tmp'
+    with open(temporary_path, 'w') as f:
+      json.dump(self.names, f)
+    os.replace(temporary_path, self.names_path)
+
+  def _upgrade(self) -> None:
+    '''Rewrites a version 1 history file in the current format, dropping a torn last record.'''
+    try:
+      with open(self.history_path, 'rb') as f:
+        if HEADER.unpack(f.read(HEADER.size)) != (MAGIC_V1, RECORD_V1.size):
+          return
+        data = f.read()
+    except (FileNotFoundError, struct.error):
+      return
+    temporary_path = self.history_path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+      f.write(HEADER.pack(MAGIC, RECORD.size))
+      whole = len(data) - len(data) % RECORD_V1.size
+      for record in RECORD_V1.iter_unpack(memoryview(data)[:whole]):
+        f.write(RECORD.pack(*record))
+    os.replace(temporary_path, self.history_path)
+
+  def _open(self) -> None:
+    self._upgrade()
+    self._file = open(self.history_path, 'ab', buffering=self.buffer_size)
+    size = self._file.tell()
+    if size < HEADER.size:
+      self._file.truncate(0)
+      self._file.write(HEADER.pack(MAGIC, RECORD.size))
+      return
+    with open(self.history_path, 'rb') as f:
+      magic, record_size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or record_size != RECORD.size:
+      self._file.close()
+      self._file = None
+      raise ValueError(f"{self.history_path} is not a pick history file")
+    # Drop a record cut short by a crash so later records stay aligned
+    torn = (size - HEADER.size) % RECORD.size
+    if torn:
+      self._file.truncate(size - torn)
+
+  def append(self, team: str, character: str, mode: str, timestamp: float = None) -> None:
+    '''Appends one pick to the history.'''
+    if self._file is None:
+      self._open()
+    character_id = self._ids[team].get(character)
+    if character_id is None:
+      character_id = self._intern(team, character)
+      self._save_names()
+    self._file.write(RECORD.pack(
+      time.time() if timestamp is None else timestamp,
+      TEAMS.index(team), MODES.index(mode), character_id))
+
+  def record(self, event: str, team: str, character: str = None) -> None:
+    '''Appends picks to the history. Used as a selector listener.'''
+    # Batch draws only report their last pick, so they are left out of the history
+    if event in MODES:
+      self.append(team, character, event)
+
+  def flush(self) -> None:
+    if self._file is not None:
+      self._file.flush()
+
+  def close(self) -> None:
+    if self._file is not None:
+      self._file.close()
+      self._file = None
+
+  def __len__(self) -> int:
+    self.flush()
+    try:
+      size = os.path.getsize(self.history_path)
+    except FileNotFoundError:
+      return 0
+    return max(0, size - HEADER.size) // RECORD.size
+
+  def records(self):
+    """
+    Returns every record as a read-only NumPy structured array backed by mmap.
+
+    The fields are time, team (an index into TEAMS), mode (an index into
+    MODES) and character (an id into names). The file stays mapped until the
+    array and every view of it are garbage collected.
+    """
+    import numpy as np
+    self.flush()
+    self._upgrade()
+    try:
+      f = open(self.history_path, 'rb')
+    except FileNotFoundError:
+      return np.empty(0, dtype=record_dtype())
+    with f:
+      count = max(0, os.fstat(f.fileno()).st_size - HEADER.size) // RECORD.size
+      if count == 0:
+        return np.empty(0, dtype=record_dtype())
+      if HEADER.unpack(f.read(HEADER.size)) != (MAGIC, RECORD.size):
+        raise ValueError(f"{self.history_path} is not a pick history file")
+      mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return np.frombuffer(mapped, dtype=record_dtype(), count=count, offset=HEADER.size)
+
+  def _team_records(self, team: str):
+    records = self.records()
+    return records[records['team'] == TEAMS.index(team)]
+
+  def play_counts(self, team: str) -> dict:
+    '''Returns the number of picks of every character of a team that was ever picked.'''
+    import numpy as np
+    counts = np.bincount(self._team_records(team)['character'], minlength=len(self.names[team]))
+    return dict(zip(self.names[team], counts.tolist()))
+
+  def droughts(self, team: str) -> dict:
+    """
+    Returns the longest and the current drought of every character of a team.
+
+    A drought is the number of picks of the team in a row that were not the
+    character, counting the picks before their first and after their last pick.
+
+    Returns:
+        dict: {'longest': int, 'current': int} per character.
+    """
+    import numpy as np
+    characters = self._team_records(team)['character']
+    total = len(characters)
+    size = len(self.names[team])
+    # Positions of each character's picks, grouped by character and ascending within a group
+    order = np.argsort(characters, kind='stable')
+    grouped = characters[order]
+    starts = np.searchsorted(grouped, np.arange(size), side='left')
+    ends = np.searchsorted(grouped, np.arange(size), side='right')
+    # Picks between each pick and the next pick of the same character
+    gaps = np.diff(order) - 1
+    same = grouped[1:] == grouped[:-1]
+    longest = np.full(size, total, dtype=np.int64)
+    current = np.full(size, total, dtype=np.int64)
+    played = ends > starts
+    first = order[starts[played]]
+    last = order[ends[played] - 1]
+    current[played] = total - 1 - last
+    longest[played] = np.maximum(first, current[played])
+    if same.any():
+      between = np.zeros(size, dtype=np.int64)
+      np.maximum.at(between, grouped[1:][same], gaps[same])
+      longest = np.maximum(longest, np.where(played, between, 0))
+    return {
+      name: {'longest': int(longest[i]), 'current': int(current[i])}
+      for i, name in enumerate(self.names[team])
+    }
+
+  def streaks(self, team: str) -> dict:
+    '''Returns the longest run of back to back picks of every character of a team that was ever picked.'''
+    import numpy as np
+    characters = self._team_records(team)['character']
+    streaks = np.zeros(len(self.names[team]), dtype=np.int64)
+    if len(characters):
+      # Run-length encode the picks, then keep each character's longest run
+      boundaries = np.flatnonzero(characters[1:] != characters[:-1]) + 1
+      starts = np.concatenate(([0], boundaries))
+      lengths = np.diff(np.concatenate((starts, [len(characters)])))
+      np.maximum.at(streaks, characters[starts], lengths)
+    return dict(zip(self.names[team], streaks.tolist()))
+
+  def picks_per_day(self, team: str = None, utc_offset: float = None) -> dict:
+    """
+    Returns the number of picks on each day that has any, oldest first.
+
+    Args:
+        team (str): Only count picks of this team. Defaults to both teams.
+        utc_offset (float): The offset of the days from UTC in seconds. Defaults to the local offset.
+    """
+    import numpy as np
+    records = self.records() if team is None else self._team_records(team)
+    if utc_offset is None:
+      utc_offset = time.localtime().tm_gmtoff
+    days, counts = np.unique((records['time'] + utc_offset) // SECONDS_PER_DAY, return_counts=True)
+    return {
+      time.strftime('%Y-%m-%d', time.gmtime(day * SECONDS_PER_DAY)): count
+      for day, count in zip(days.tolist(), counts.tolist())
+    }
@@ -0,0 +1,252 @@
+import json
+import math
+import random
+from bisect import bisect_right
+from typing import NamedTuple
+
+PERK_SLOTS = 4
+ADDON_SLOTS = 2
+
+# A Mersenne prime larger than any index, used to mix the Feistel round inputs
+_MODULUS = (1 << 127) - 1
+_MULTIPLIER = 0x9E3779B97F4A7C15
+
+
+def load_loadout_data(path: str) -> dict:
+  '''Reads the perks, add-ons, items and offerings of each team from a JSON data file.'''
+  with open(path, encoding='utf-8') as f:
+    return json.load(f)
+
+
+def unrank_combination(rank: int, n: int, k: int) -> tuple:
+  """
+  Returns the k-subset of range(n) with the given rank in colexicographic order.
+
+  This is the combinatorial number system: every rank in [0, comb(n, k)) is
+  the sum of comb(c_i, i) over the elements c_k > ... > c_1 of exactly one
+  subset, so the subset is decoded element by element without listing any
+  other subset.
+  """
+  subset = []
+  upper = n
+  for size in range(k, 0, -1):
+    # The largest c below upper with comb(c, size) <= rank, found by bisection
+    low, high = size - 1, upper - 1
+    while low < high:
+      middle = (low + high + 1) // 2
+      if math.comb(middle, size) <= rank:
+        low = middle
+      else:
+        high = middle - 1
+    subset.append(low)
+    rank -= math.comb(low, size)
+    upper = low
+  subset.reverse()
+  return tuple(subset)
+
+
+# The Build class is one loadout: a character with their perks, item, add-ons and offering.
+class Build(NamedTuple):
+  character: str
+  perks: tuple
+  item: str
+  # None when the loadout data has no add-ons for the character, unlike () when all of them are excluded
+  addons: tuple
+  offering: str
+
+
+# The _BuildSpace class counts and decodes the builds of a single character.
+class _BuildSpace:
+
+  def __init__(self, perks: tuple, kits: list, offerings: tuple) -> None:
+    """
+    Initializes the _BuildSpace.
+
+    Builds are numbered in mixed radix: the offering is the lowest digit, then
+    the item and add-ons (a kit), then the rank of the perk combination.
+
+    Args:
+        perks (tuple): The perks the character can equip.
+        kits (list): (item, add-ons) pairs, one per item the character can bring. Add-ons
+            are None when the data has none for the character.
+        offerings (tuple): The offerings the character can burn.
+    """
+    self.perks = perks
+    self.perk_slots = min(PERK_SLOTS, len(perks))
+    self.kits = [(item, addons, min(ADDON_SLOTS, len(addons or ()))) for item, addons in kits]
+    # Offsets of the first add-on combination of each kit, for bisection
+    self.kit_offsets = [0]
+    for _, addons, slots in self.kits:
+      self.kit_offsets.append(self.kit_offsets[-1] + math.comb(len(addons or ()), slots))
+    self.offerings = offerings or (None,)
+    self.size = math.comb(len(perks), self.perk_slots) * self.kit_offsets[-1] * len(self.offerings)
+
+  def decode(self, character: str, index: int) -> Build:
+    index, offering = divmod(index, len(self.offerings))
+    rank, kit_index = divmod(index, self.kit_offsets[-1])
+    kit = bisect_right(self.kit_offsets, kit_index) - 1
+    item, addons, slots = self.kits[kit]
+    addon_rank = kit_index - self.kit_offsets[kit]
+    return Build(
+      character,
+      tuple(self.perks[i] for i in unrank_combination(rank, len(self.perks), self.perk_slots)),
+      item,
+      None if addons is None else tuple(addons[i] for i in unrank_combination(addon_rank, len(addons), slots)),
+      self.offerings[offering])
+
+
+# The IndexPermutation class is a keyed pseudo-random permutation of range(size) that needs no memory per index.
+class IndexPermutation:
+
+  ROUNDS = 4
+
+  def __init__(self, size: int, rng=None) -> None:
+    """
+    Initializes the IndexPermutation.
+
+    A balanced Feistel network over the smallest even number of bits that
+    holds size is a permutation whatever its round function does. Outputs of
+    size or more are fed back in (cycle walking), which keeps the permutation
+    inside range(size) at fewer than 4 rounds of the network on average.
+
+    Args:
+        size (int): The number of indices to permute.
+        rng (random.Random): The random number generator for the round keys.
+    """
+    rng = rng or random
+    self.size = size
+    bits = max(2, (size - 1).bit_length())
+    self.half = (bits + 1) // 2
+    self.mask = (1 << self.half) - 1
+    self.keys = [rng.getrandbits(64) for _ in range(self.ROUNDS)]
+
+  def __len__(self) -> int:
+    return self.size
+
+  def __getitem__(self, index: int) -> int:
+    if not 0 <= index < self.size:
+      raise IndexError(index)
+    half, mask = self.half, self.mask
+    while True:
+      left, right = index >> half, index & mask
+      for key in self.keys:
+        mixed = (right + key) * _MULTIPLIER % _MODULUS
+        left, right = right, left ^ ((mixed ^ (mixed >> half)) & mask)
+      index = (left << half) | right
+      if index < self.size:
+        return index
+
+
+# The LoadoutGenerator class samples random builds of a team without listing the combinations.
+class LoadoutGenerator:
+
+  def __init__(self, data: dict, team: str, characters, excluded=()) -> None:
+    """
+    Initializes the LoadoutGenerator.
+
+    Each character's builds are counted with binomial coefficients and a
+    build is decoded straight from its index, so sampling is uniform and
+    never rejects a draw however many perks, add-ons or offerings are
+    excluded.
+
+    Args:
+        data (dict): The loadout data of both teams, see load_loadout_data.
+        team (str): 'killer' or 'survivor'.
+        characters (iterable): The characters of the team to build for.
+        excluded (collection): Names of perks, items, add-ons and offerings never to use.
+
+    Attributes:
+        characters (tuple): The characters of the team, in the order their builds are numbered.
+        offsets (list): The index of the first build of each character, followed by the total.
+        size (int): The number of distinct builds of the team.
+    """
+    self.data = data[team]
+    self.team = team
+    self.restrictions = data.get('restrictions', {}).get(team, {})
+    self.excluded = frozenset(excluded)
+    self._spaces = {}
+    self.characters = tuple(dict.fromkeys(characters))
+    self.offsets = [0]
+    for character in self.characters:
+      self.offsets.append(self.offsets[-1] + self._space(character).size)
+    self.size = self.offsets[-1]
+
+  def _space(self, character: str) -> _BuildSpace:
+    space = self._spaces.get(character)
+    if space is None:
+      # Restrictions are extra exclusions that only apply to one character
+      excluded = self.excluded.union(self.restrictions.get(character, ()))
+
+      def allowed(names):
+        return tuple(name for name in names if name not in excluded)
+
+      if 'items' in self.data:
+        kits = [
+          (item, allowed(addons))
+          for item, addons in self.data['items'].items() if item not in excluded
+        ] or [(None, ())]
+      else:
+        addons = self.data.get('addons', {}).get(character)
+        kits = [(None, None if addons is None else allowed(addons))]
+      space = self._spaces[character] = _BuildSpace(
+        allowed(self.data['perks']), kits, allowed(self.data.get('offerings', ())))
+    return space
+
+  def build(self, index: int) -> Build:
+    '''Returns the build with the given index in [0, size).'''
+    if not 0 <= index < self.size:
+      raise IndexError(f"Build index out of range: {index}")
+    position = bisect_right(self.offsets, index) - 1
+    return self._space(self.characters[position]).decode(
+      self.characters[position], index - self.offsets[position])
+
+  def build_for(self, character: str, rng=None) -> Build:
+    '''Returns a uniformly random build of one character, who does not need to be in characters.'''
+    rng = rng or random
+    space = self._space(character)
+    return space.decode(character, rng.randrange(space.size))
+
+  def sample(self, rng=None, weights: dict = None) -> Build:
+    """
+    Returns a random build.
+
+    Args:
+        rng (random.Random): The random number generator. Defaults to the random module.
+        weights (dict): Character weights (unlisted characters weigh 1). Without
+            weights every build of the team is equally likely, so characters with
+            more add-ons come up more often. With weights the character is drawn
+            by weight first and then one of their builds uniformly.
+    """
+    rng = rng or random
+    if weights is None:
+      if self.size == 0:
+        raise IndexError('Cannot choose from an empty build space')
+      return self.build(rng.randrange(self.size))
+    character = rng.choices(self.characters, [weights.get(i, 1.0) for i in self.characters])[0]
+    return self.build_for(character, rng)
+
+  def stream(self, rng=None):
+    """
+    Yields every build of the team exactly once, in random order.
+
+    Builds are produced lazily through an IndexPermutation, so memory use
+    does not depend on how many builds there are. Stop early with
+    itertools.islice.
+    """
+    permutation = IndexPermutation(self.size, rng)
+    for i in range(self.size):
+      yield self.build(permutation[i])
+
+
+def format_build(build: Build) -> str:
+  '''Returns a build as printable lines.'''
+  lines = [f"Perks: {', '.join(build.perks) or 'none'}"]
+  if build.item is not None:
+    lines.append(f"Item: {build.item}")
+  if build.addons is None:
+    # An empty slot here would look like a build that picked no add-ons
+    lines.append("Add-ons: not in the loadout data")
+  else:
+    lines.append(f"Add-ons: {', '.join(build.addons) or 'none'}")
+  lines.append(f"Offering: {build.offering or 'none'}")
+  return '\n'.join(lines)
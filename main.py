@@ -1,10 +1,76 @@
+import atexit
 import sys
 from enum import Enum
-from selector import CharacterSelector
-from config import initialize_config
+from functools import cache
+from selector import MIN_INCLUDED, CharacterSelector
+from config import ConfigWatcher, get_config_file_path, load_config
 
-config = initialize_config('settings.ini')
-character_selector = CharacterSelector(config)
+CONFIG_FILE = 'settings.ini'
+
+# Loadout generators by team, created on the first 'loadout' command
+loadout_generators = {}
+
+# Commands of run_command, kept apart in the batch latency histograms
+BATCH_COMMANDS = ('pick', 'loadout', 'history', 'stats', 'mode', 'team', 'exclude', 'include', 'clear', 'preset')
+
+
+# Nothing is read or written when this module is imported. The configuration,
+# the selector and the files behind it are set up by the first command that needs them.
+@cache
+def get_config():
+  """Returns the configuration settings, read from CONFIG_FILE next to this script."""
+  return load_config(get_config_file_path(CONFIG_FILE))
+
+
+@cache
+def get_selector():
+  """Returns the CharacterSelector of this run, restored from the state file and recording to the history."""
+  config = get_config()
+  character_selector = CharacterSelector(config)
+
+  # Pick up the rotation where the last run left off and keep journaling it
+  if config['state_file']:
+    from state import StateStore
+    state_store = StateStore(get_config_file_path(config['state_file']),
+                             fsync=config['fsync'])
+    state_store.attach(character_selector)
+    atexit.register(state_store.close)
+
+  history_log = get_history_log()
+  if history_log is not None:
+    character_selector.listeners.append(history_log.record)
+  return character_selector
+
+
+@cache
+def get_config_watcher():
+  """Returns the watcher that applies roster edits in the configuration file between commands without a restart."""
+  return ConfigWatcher(get_config_file_path(CONFIG_FILE), get_selector())
+
+
+@cache
+def get_history_log():
+  """Returns the log every pick is appended to for the 'history' command, or None if no history is kept."""
+  config = get_config()
+  if not config['history_file']:
+    return None
+  from history import HistoryLog
+  history_log = HistoryLog(get_config_file_path(config['history_file']))
+  atexit.register(history_log.close)
+  return history_log
+
+
+@cache
+def get_metrics():
+  """Returns the instrumentation of this run, written to the metrics file at exit, or None if it is turned off."""
+  config = get_config()
+  if not config['metrics_file']:
+    return None
+  from metrics import Metrics
+  metrics = Metrics()
+  metrics.instrument_selector(get_selector())
+  atexit.register(metrics.dump, get_config_file_path(config['metrics_file']))
+  return metrics
 
 
 def print_menu():
@@ -15,6 +81,10 @@ def print_menu():
   print("Enter E to exit the program.")
   print("Enter 'remove' to exclude a character from current team.")
   print("Enter 'clear' to stop exluding a character from current team.")
+  print("Enter 'preset' to exclude characters with a preset from the configuration file.")
+  print("Enter 'loadout' to select a random character with a random build.")
+  print("Enter 'history' to see how often each character of the current team was played.")
+  print("Enter 'stats' to see latency histograms and pick counters if metricsFile is set.")
   print("\n")
 
 
@@ -27,6 +97,7 @@ def cancel():
 
 
 def pick_character(user_choice):
+  character_selector = get_selector()
   previous_team = "Survivor" if character_selector.last_selected_team else "Killer"
   if user_choice != '':
     new_team = "Survivor" if user_choice == '1' else "Killer"
@@ -39,6 +110,7 @@ def pick_character(user_choice):
 
 
 def switch_mode():
+  character_selector = get_selector()
   character_selector.selection_mode = not character_selector.selection_mode
   print(
     f"\nSwitching mode to {'normal random' if character_selector.selection_mode else 'cycle random'}..."
@@ -63,21 +135,21 @@ def display_characters(team, available_characters, description):
 
 
 def exclude_character():
+  character_selector = get_selector()
   team = "survivor" if character_selector.last_selected_team else "killer"
-  characters = list(character_selector.config_characters[team])
-  excluded = character_selector.excluded_characters[team]
+  roster = character_selector.rosters[team]
+  # Sort the roster once, each pass only filters it against the exclusion mask
+  order = sorted(range(len(roster)), key=lambda i: roster.names[i].lower())
 
   while True:
-    available_characters = [
-      char for char in characters if char not in excluded
-    ]
-    available_characters = sorted(available_characters, key=str.lower)
-    if len(available_characters) == 3:
+    if character_selector.included_count(team) <= MIN_INCLUDED:
       print(
         "No more characters can be excluded. Please clear some characters from the excluded list first."
       )
       break
 
+    excluded = set(roster.indices(character_selector.excluded_masks[team]))
+    available_characters = [roster.names[i] for i in order if i not in excluded]
     display_characters(team, available_characters, 'included')
 
     try:
@@ -95,7 +167,7 @@ def exclude_character():
             f"Are you really sure you want to remove {exclusion} from {team}s? "
           )
           if confirmation.lower() in yes():
-            character_selector.excluded_characters[team].append(exclusion)
+            character_selector.exclude_character(team, exclusion)
             print(f"{exclusion} was successfully removed from {team}s.\n")
           else:
             continue
@@ -108,6 +180,7 @@ def exclude_character():
 
 
 def clear_exclusions():
+  character_selector = get_selector()
   team = "survivor" if character_selector.last_selected_team else "killer"
   excluded_characters = sorted(character_selector.excluded_characters[team], key=str.lower)
 
@@ -130,7 +203,7 @@ def clear_exclusions():
           f"Are you sure you want to clear {character} from the {team} excluded list? "
         )
         if confirmation.lower() in yes():
-          character_selector.excluded_characters[team].remove(character)
+          character_selector.include_character(team, character)
           print(f"{character} has been cleared from the {team} excluded list.")
         else:
           continue
@@ -143,7 +216,7 @@ def clear_exclusions():
         f"Are you sure you want to remove all characters from the {team} excluded list? "
       )
       if confirmation.lower() in yes():
-        character_selector.excluded_characters[team] = []
+        character_selector.clear_excluded_characters(team)
         print(
           f"All characters have been cleared from the {team} excluded list.")
       else:
@@ -156,6 +229,135 @@ def clear_exclusions():
       print("Invalid choice. Please enter a valid number, 'all', or 'cancel'.")
 
 
+def apply_preset(team, names, combine):
+  """Applies the union or intersection of presets, keeping at least MIN_INCLUDED characters included."""
+  character_selector = get_selector()
+  for name in names:
+    if name not in character_selector.presets[team]:
+      raise ValueError(f"Unknown {team} preset: {name}")
+  mask = character_selector.preset_mask(team, *names, combine=combine)
+  if len(character_selector.rosters[team]) - mask.bit_count() < MIN_INCLUDED:
+    raise ValueError(f"Presets would leave fewer than {MIN_INCLUDED} characters")
+  character_selector.set_excluded_mask(team, mask)
+
+
+def choose_preset():
+  character_selector = get_selector()
+  team = "survivor" if character_selector.last_selected_team else "killer"
+  presets = sorted(character_selector.presets[team])
+  if not presets:
+    print(f"No {team} presets are defined in the configuration file.\n")
+    return
+
+  print(f"\nCurrent {team} presets:")
+  for i, name in enumerate(presets, start=1):
+    print(f"{i}. {name} (excludes {character_selector.presets[team][name].bit_count()})")
+  choice = input(
+    "\nEnter the number of a preset to use it.\n"
+    "Join numbers with '+' to combine presets or '&' to keep only what they share.\n"
+    "Enter 'cancel' to go back: ")
+  if choice.lower() in cancel():
+    print("Returning to the main menu...\n")
+    return
+
+  combine = 'intersection' if '&' in choice else 'union'
+  try:
+    numbers = [int(number) for number in choice.replace('&', '+').split('+')]
+    if not all(1 <= number <= len(presets) for number in numbers):
+      raise ValueError("Invalid number selection")
+    apply_preset(team, [presets[number - 1] for number in numbers], combine)
+  except ValueError as e:
+    print(f"{e}. No preset was applied.\n")
+    return
+  print(f"{character_selector.excluded_count(team)} {team} characters are now excluded.\n")
+
+
+def get_loadout_generator(team):
+  """Returns the loadout generator of a team, reading the loadout data file the first time."""
+  generator = loadout_generators.get(team)
+  if generator is None:
+    from loadout import LoadoutGenerator, load_loadout_data
+    character_selector = get_selector()
+    config = get_config()
+    path = get_config_file_path(config['loadout_file'])
+    try:
+      data = load_loadout_data(path)
+    except (OSError, ValueError) as e:
+      raise ValueError(f"Could not read loadout data from {path}: {e}") from None
+    generator = loadout_generators[team] = LoadoutGenerator(
+      data, team, character_selector.rosters[team].names, config['loadout_exclusions'])
+  return generator
+
+
+def pick_loadout():
+  character_selector = get_selector()
+  team = "survivor" if character_selector.last_selected_team else "killer"
+  try:
+    generator = get_loadout_generator(team)
+  except ValueError as e:
+    print(f"{e}\n")
+    return
+  from loadout import format_build
+  character = character_selector.pick(team)
+  build = generator.build_for(character, character_selector.rng)
+  character_selector.print_character_selection(character)
+  print(format_build(build) + "\n")
+
+
+def history_summary(team, queries=('counts', 'droughts', 'streaks', 'days')):
+  """Returns the requested history queries of a team as a dictionary."""
+  history_log = get_history_log()
+  if history_log is None:
+    raise ValueError("No history is kept. Set historyFile in the configuration file")
+  summary = {}
+  for query in queries:
+    if query == 'counts':
+      summary[query] = history_log.play_counts(team)
+    elif query == 'droughts':
+      summary[query] = history_log.droughts(team)
+    elif query == 'streaks':
+      summary[query] = history_log.streaks(team)
+    elif query == 'days':
+      summary[query] = history_log.picks_per_day(team)
+    else:
+      raise ValueError(f"Unknown history query: {query}")
+  return summary
+
+
+def show_history():
+  character_selector = get_selector()
+  team = "survivor" if character_selector.last_selected_team else "killer"
+  try:
+    summary = history_summary(team)
+  except ValueError as e:
+    print(f"{e}.\n")
+    return
+  counts = summary['counts']
+  if not counts:
+    print(f"No {team} picks were recorded yet.\n")
+    return
+
+  print(f"\n{sum(counts.values())} {team} picks recorded.")
+  print(f"{'Character':<20}{'Plays':>7}{'Longest drought':>17}{'Current drought':>17}{'Best streak':>13}")
+  for character in sorted(counts, key=lambda i: (-counts[i], i.lower())):
+    drought = summary['droughts'][character]
+    print(f"{character:<20}{counts[character]:>7}{drought['longest']:>17}"
+          f"{drought['current']:>17}{summary['streaks'][character]:>13}")
+  print("\nPicks per day:")
+  for day, count in list(summary['days'].items())[-7:]:
+    print(f"{day}: {count}")
+  print()
+
+
+def show_stats():
+  metrics = get_metrics()
+  if metrics is None:
+    print("Instrumentation is off. Set metricsFile in the configuration file.\n")
+    return
+  print()
+  print(metrics.to_prometheus())
+
+
 def determine_input(choice):
   choice = choice.lower()
   if choice in ['0', '1', '']:
@@ -168,6 +370,14 @@ def determine_input(choice):
     return Action.EXCLUDE
   elif choice == 'clear':
     return Action.CLEAR
+  elif choice in ['preset', 'presets']:
+    return Action.PRESET
+  elif choice in ['loadout', 'build']:
+    return Action.LOADOUT
+  elif choice == 'history':
+    return Action.HISTORY
+  elif choice in ['stats', 'metrics']:
+    return Action.STATS
   elif choice == 'menu':
     return Action.MENU
   else:
@@ -180,6 +390,10 @@ class Action(Enum):
     EXIT = ('exit', exit_program)
     EXCLUDE = ('exclude', exclude_character)
     CLEAR = ('clear', clear_exclusions)
+    PRESET = ('preset', choose_preset)
+    LOADOUT = ('loadout', pick_loadout)
+    HISTORY = ('history', show_history)
+    STATS = ('stats', show_stats)
     MENU = ('menu', print_menu)
 
     def __init__(self, action_name, action_function):
@@ -198,24 +412,189 @@ class Action(Enum):
         self.action_function()
 
 
+def run_action(action, choice):
+    if action == Action.PICK_CHARACTER:
+        pick_character(choice)
+    elif action is not None:
+        action.execute()
+    else:
+        print("\nYou made an invalid selection. Try again.\n")
+        print_menu()
+
+
 def get_user_choice():
+    character_selector = get_selector()
+    metrics = get_metrics()
     while True:
         current_team = "Survivor" if character_selector.last_selected_team else "Killer"
-        choice = input(f"Current team is {current_team}. Make your choice: ")
-        action = determine_input(choice)
+        if metrics is None:
+            get_config_watcher().poll()
+            choice = input(f"Current team is {current_team}. Make your choice: ")
+            run_action(determine_input(choice), choice)
+            continue
 
-        if action == Action.PICK_CHARACTER:
-            pick_character(choice)
-        elif action is not None:
-            action.execute()
-        else:
-            print("\nYou made an invalid selection. Try again.\n")
-            print_menu()
+        # Time each step apart; the time spent waiting for input is left out
+        with metrics.timer('dispatch_seconds', step='config_poll'):
+            get_config_watcher().poll()
+        choice = input(f"Current team is {current_team}. Make your choice: ")
+        with metrics.timer('dispatch_seconds', step='determine_input'):
+            action = determine_input(choice)
+        with metrics.timer('action_seconds', action=action.action_name if action else 'invalid'):
+            run_action(action, choice)
+
+
+def parse_team(word):
+  """Returns the team named by a batch command argument."""
+  team = {
+    '0': 'killer', 'killer': 'killer', 'killers': 'killer',
+    '1': 'survivor', 'survivor': 'survivor', 'survivors': 'survivor'
+  }.get(word.lower())
+  if team is None:
+    raise ValueError(f"Unknown team: {word}")
+  return team
+
+
+def run_command(line):
+  """
+  Executes one batch command without prompts and returns its result as a dictionary.
+
+  Commands:
+      pick [killer|survivor|0|1]       Picks a character, optionally switching team first.
+      mode [cycle|random]              Sets the selection mode, or toggles it.
+      team killer|survivor             Switches the current team.
+      exclude killer|survivor <name>   Excludes a character.
+      include killer|survivor <name>   Stops excluding a character.
+      clear killer|survivor|all        Stops excluding every character of a team, or of both.
+      preset killer|survivor <name>    Replaces the exclusions with a preset. Join several
+                                       names with ' + ' for their union or ' & ' for their intersection.
+      loadout [killer|survivor|0|1]    Picks a character like 'pick' and a random build for them.
+      history [killer|survivor] [counts|droughts|streaks|days]
+                                       Queries the pick history of a team (the current team
+                                       by default), all queries unless some are named.
+      stats [json|prometheus]          Returns a snapshot of the instrumentation, by default
+                                       as JSON fields and with 'prometheus' as one text field.
+  """
+  character_selector = get_selector()
+  command, _, argument = line.strip().partition(' ')
+  command = command.lower()
+  argument = argument.strip()
+
+  if command == 'pick':
+    if argument:
+      character_selector.last_selected_team = parse_team(argument) == 'survivor'
+    team = "survivor" if character_selector.last_selected_team else "killer"
+    return {'command': command, 'team': team, 'character': character_selector.pick(team)}
+  elif command == 'loadout':
+    if argument:
+      character_selector.last_selected_team = parse_team(argument) == 'survivor'
+    team = "survivor" if character_selector.last_selected_team else "killer"
+    generator = get_loadout_generator(team)
+    build = generator.build_for(character_selector.pick(team), character_selector.rng)
+    return {'command': command, 'team': team, **build._asdict()}
+  elif command == 'history':
+    words = argument.split()
+    team = "survivor" if character_selector.last_selected_team else "killer"
+    if words and words[0] not in ('counts', 'droughts', 'streaks', 'days'):
+      team = parse_team(words.pop(0))
+    return {'command': command, 'team': team, **history_summary(team, words or ('counts', 'droughts', 'streaks', 'days'))}
+  elif command == 'stats':
+    metrics = get_metrics()
+    if metrics is None:
+      raise ValueError("Instrumentation is off. Set metricsFile in the configuration file")
+    if argument not in ('', 'json', 'prometheus'):
+      raise ValueError(f"Unknown stats format: {argument}")
+    if argument == 'prometheus':
+      return {'command': command, 'text': metrics.to_prometheus()}
+    return {'command': command, **metrics.snapshot()}
+  elif command == 'mode':
+    if argument not in ('', 'cycle', 'random'):
+      raise ValueError(f"Unknown mode: {argument}")
+    character_selector.selection_mode = (
+      not character_selector.selection_mode if argument == '' else argument == 'random')
+    return {'command': command, 'mode': 'random' if character_selector.selection_mode else 'cycle'}
+  elif command == 'team':
+    team = parse_team(argument)
+    character_selector.last_selected_team = team == 'survivor'
+    return {'command': command, 'team': team}
+  elif command in ('exclude', 'include'):
+    team_word, _, character = argument.partition(' ')
+    team = parse_team(team_word)
+    character = character.strip()
+    if character not in character_selector.config_characters[team]:
+      raise ValueError(f"Unknown {team} character: {character}")
+    if command == 'exclude':
+      already_excluded = character_selector.excluded_masks[team] & character_selector.rosters[team].bit(character)
+      if not already_excluded and character_selector.included_count(team) <= MIN_INCLUDED:
+        raise ValueError("No more characters can be excluded")
+      character_selector.exclude_character(team, character)
+    else:
+      character_selector.include_character(team, character)
+    return {'command': command, 'team': team, 'character': character}
+  elif command == 'clear':
+    teams = ['killer', 'survivor'] if argument.lower() == 'all' else [parse_team(argument)]
+    for team in teams:
+      character_selector.clear_excluded_characters(team)
+    return {'command': command, 'teams': teams}
+  elif command == 'preset':
+    team_word, _, names = argument.partition(' ')
+    team = parse_team(team_word)
+    combine = 'intersection' if ' & ' in names else 'union'
+    names = [name.strip().lower() for name in names.replace(' & ', ' + ').split(' + ')]
+    apply_preset(team, names, combine)
+    return {'command': command, 'team': team, 'presets': names, 'excluded': character_selector.excluded_count(team)}
+  raise ValueError(f"Unknown command: {command}")
+
+
+def run_batch(lines, output, flush_every=10000):
+  """
+  Runs batch commands and writes one JSON line per command to output.
+
+  Results are buffered and written flush_every lines at a time, so the speed
+  of the output stream does not limit the speed of the commands. Blank lines
+  and lines starting with '#' are skipped. A failing command writes an
+  'error' line and the batch continues.
+  """
+  import json
+  metrics = get_metrics()
+  buffer = []
+  for number, line in enumerate(lines, start=1):
+    if not line.strip() or line.lstrip().startswith('#'):
+      continue
+    try:
+      if metrics is None:
+        result = run_command(line)
+      else:
+        command = line.split(None, 1)[0].lower()
+        # Keep mistyped commands from adding a histogram each
+        with metrics.timer('command_seconds', command=command if command in BATCH_COMMANDS else 'unknown'):
+          result = run_command(line)
+    except (ValueError, IndexError) as e:
+      result = {'line': number, 'error': str(e)}
+    buffer.append(json.dumps(result))
+    if len(buffer) >= flush_every:
+      output.write('\n'.join(buffer) + '\n')
+      buffer.clear()
+  if buffer:
+    output.write('\n'.join(buffer) + '\n')
+  output.flush()
 
 
 def main():
-  print_menu()
-  get_user_choice()
+  import argparse
+  parser = argparse.ArgumentParser(description='Pick a random Dead by Daylight character to play.')
+  parser.add_argument(
+    '--batch', nargs='?', const='-', metavar='FILE',
+    help="run commands from FILE (or stdin if omitted or '-') and print JSON lines instead of prompting")
+  args = parser.parse_args()
+
+  if args.batch == '-':
+    run_batch(sys.stdin, sys.stdout)
+  elif args.batch is not None:
+    with open(args.batch) as f:
+      run_batch(f, sys.stdout)
+  else:
+    print_menu()
+    get_user_choice()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,233 @@
+import os
+import time
+from bisect import bisect_left
+
+# Upper bounds of the latency buckets in seconds, from 1 microsecond to 10 seconds
+BUCKETS = tuple(
+  round(base * 10.0 ** exponent, 9)
+  for exponent in range(-6, 1)
+    for base in (1, 2.5, 5)
+) + (10.0,)
+
+PREFIX = 'dbd_'
+# The help text and type of every metric family, in export order
+FAMILIES = {
+  'action_seconds': ('Time spent executing an interactive menu action', 'histogram'),
+  'command_seconds': ('Time spent running a batch command', 'histogram'),
+  'dispatch_seconds': ('Time spent in the command loop around actions', 'histogram'),
+  'selector_seconds': ('Time spent in a selector pick path', 'histogram'),
+  'picks_total': ('Characters picked one at a time', 'counter'),
+  'cycle_resets_total': ('Cycles started in cycle mode', 'counter'),
+  'excluded_characters': ('Characters currently excluded', 'gauge'),
+}
+
+
+# The Histogram class counts observations into fixed latency buckets.
+class Histogram:
+
+  __slots__ = ('counts', 'count', 'sum')
+
+  def __init__(self) -> None:
+    """
+    Initializes the Histogram.
+
+    Attributes:
+        counts (list): The number of observations per bucket of BUCKETS, plus one for larger ones.
+        count (int): The number of observations.
+        sum (float): The sum of the observations in seconds.
+    """
+    self.counts = [0] * (len(BUCKETS) + 1)
+    self.count = 0
+    self.sum = 0.0
+
+  def observe(self, seconds: float) -> None:
+    self.counts[bisect_left(BUCKETS, seconds)] += 1
+    self.count += 1
+    self.sum += seconds
+
+  def quantile(self, fraction: float) -> float:
+    '''Returns the upper bound of the bucket holding the given quantile, or None past the last bucket or without observations.'''
+    if self.count == 0:
+      return None
+    rank = fraction * self.count
+    seen = 0
+    for bound, count in zip(BUCKETS, self.counts):
+      seen += count
+      if seen >= rank:
+        return bound
+    return None
+
+  def cumulative(self) -> list:
+    '''Returns (upper bound, observations up to it) pairs, ending with infinity like Prometheus buckets.'''
+    pairs = []
+    seen = 0
+    for bound, count in zip(BUCKETS + (float('inf'),), self.counts):
+      seen += count
+      pairs.append((bound, seen))
+    return pairs
+
+
+# The _Timer class is the context manager returned by Metrics.timer.
+class _Timer:
+
+  __slots__ = ('histogram', 'start')
+
+  def __init__(self, histogram: Histogram) -> None:
+    self.histogram = histogram
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, *exc_info) -> None:
+    self.histogram.observe(time.perf_counter() - self.start)
+
+
+# The Metrics class collects latency histograms, counters and gauges of one run and exports them.
+class Metrics:
+
+  def __init__(self) -> None:
+    """
+    Initializes the Metrics.
+
+    Nothing in the selector or the command loop refers to this class unless
+    instrumentation is turned on, so a run without it pays nothing. Every
+    metric is a family of FAMILIES plus a tuple of (label, value) pairs.
+
+    Attributes:
+        histograms (dict): The Histogram of every latency metric by (family, labels).
+        counters (dict): The count of every counter metric by (family, labels).
+        gauges (list): Callables returning {(family, labels): value}, read when a snapshot is taken.
+    """
+    self.histograms = {}
+    self.counters = {}
+    self.gauges = []
+
+  def histogram(self, family: str, **labels) -> Histogram:
+    key = (family, tuple(labels.items()))
+    histogram = self.histograms.get(key)
+    if histogram is None:
+      histogram = self.histograms[key] = Histogram()
+    return histogram
+
+  def timer(self, family: str, **labels) -> _Timer:
+    '''Returns a context manager that records the time spent in its block.'''
+    return _Timer(self.histogram(family, **labels))
+
+  def increment(self, family: str, amount: int = 1, **labels) -> None:
+    key = (family, tuple(labels.items()))
+    self.counters[key] = self.counters.get(key, 0) + amount
+
+  def record(self, event: str, team: str, character: str = None) -> None:
+    '''Counts picks and cycle resets. Used as a selector listener.'''
+    if event in ('random', 'cycle'):
+      self.increment('picks_total', team=team, character=character)
+    elif event == 'reset':
+      self.increment('cycle_resets_total', team=team)
+
+  def instrument_selector(self, selector) -> None:
+    """
+    Records the pick paths, picks, cycle resets and exclusions of a selector.
+
+    The pick paths are timed by shadowing the selector's methods with timed
+    wrappers on the instance, so the selector class itself has no timing code
+    and other selectors are left alone.
+    """
+    for path, name in (('random', '_random_pick'), ('cycle', '_cycle_pick'),
+                       ('cycle_avoiding', '_cycle_pick_avoiding'), ('reset', '_reset_cycle'),
+                       ('batch', 'sample_batch')):
+      setattr(selector, name, self._timed(self.histogram('selector_seconds', path=path), getattr(selector, name)))
+    selector.listeners.append(self.record)
+    self.gauges.append(lambda: {
+      ('excluded_characters', (('team', team),)): selector.excluded_count(team)
+      for team in selector.rosters
+    })
+
+  @staticmethod
+  def _timed(histogram: Histogram, function):
+    clock = time.perf_counter
+
+    def timed(*args, **kwargs):
+      start = clock()
+      try:
+        return function(*args, **kwargs)
+      finally:
+        histogram.observe(clock() - start)
+
+    return timed
+
+  def _gauge_values(self) -> dict:
+    values = {}
+    for gauge in self.gauges:
+      values.update(gauge())
+    return values
+
+  def snapshot(self) -> dict:
+    """
+    Returns every metric as a dictionary that can be written as JSON.
+
+    Histograms are reported with their count, sum, estimated p50 and p99 (the
+    upper bound of the bucket holding them) and cumulative buckets.
+    """
+    snapshot = {'time': time.time()}
+    for (family, labels), histogram in sorted(self.histograms.items()):
+      if histogram.count == 0:
+        continue
+      snapshot.setdefault(family, []).append({
+        'labels': dict(labels),
+        'count': histogram.count,
+        'sum': histogram.sum,
+        'p50': histogram.quantile(0.5),
+        'p99': histogram.quantile(0.99),
+        'buckets': {_bound(bound): count for bound, count in histogram.cumulative()}
+      })
+    for (family, labels), value in sorted({**self.counters, **self._gauge_values()}.items()):
+      snapshot.setdefault(family, []).append({'labels': dict(labels), 'value': value})
+    return snapshot
+
+  def to_json(self) -> str:
+    import json
+    return json.dumps(self.snapshot())
+
+  def to_prometheus(self) -> str:
+    '''Returns every metric in the Prometheus text exposition format.'''
+    samples = {family: [] for family in FAMILIES}
+    for (family, labels), histogram in sorted(self.histograms.items()):
+      if histogram.count == 0:
+        continue
+      for bound, count in histogram.cumulative():
+        samples[family].append(f"{PREFIX}{family}_bucket{_labels(labels + (('le', _bound(bound)),))} {count}")
+      samples[family].append(f"{PREFIX}{family}_sum{_labels(labels)} {histogram.sum!r}")
+      samples[family].append(f"{PREFIX}{family}_count{_labels(labels)} {histogram.count}")
+    for (family, labels), value in sorted({**self.counters, **self._gauge_values()}.items()):
+      samples[family].append(f"{PREFIX}{family}{_labels(labels)} {value}")
+
+    lines = []
+    for family, (description, kind) in FAMILIES.items():
+      if samples[family]:
+        lines.append(f"# HELP {PREFIX}{family} {description}")
+        lines.append(f"# TYPE {PREFIX}{family} {kind}")
+        lines.extend(samples[family])
+    return '\n'.join(lines) + '\n'
+
+  def dump(self, path: str) -> None:
+    '''Writes a snapshot to path, as JSON if it ends with .json and in Prometheus text format otherwise.'''
+    text = self.to_json() if path.endswith('.json') else self.to_prometheus()
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'w') as f:
+      f.write(text)
+    os.replace(temporary_path, path)
+
+
+def _bound(bound: float) -> str:
+  return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _labels(labels) -> str:
+  if not labels:
+    return ''
+  escaped = (
+    str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    for _, value in labels
+  )
+  return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
@@ -0,0 +1,93 @@
+import asyncio
+import random
+import uuid
+
+from roster import build_rosters
+from selector import CharacterSelector
+
+LOBBY_SIZE = 4
+
+
+# The Lobby class draws distinct survivors (and optionally a killer) for the players of one lobby.
+class Lobby:
+
+  def __init__(self, config: dict, survivors: list, killer=None, rng=None) -> None:
+    """
+    Initializes the Lobby.
+
+    Every player has their own CharacterSelector, so each keeps their own
+    cycle rotation and previous pick. The lock only serializes draws of this
+    lobby, so different lobbies never wait on each other.
+
+    Args:
+        config (dict): The configuration settings, ideally with shared 'rosters'.
+        survivors (list): The ids of up to 4 survivor players.
+        killer: The id of the killer player, or None for a survivor only lobby.
+        rng (random.Random): The random number generator for picks.
+    """
+    if not 1 <= len(survivors) <= LOBBY_SIZE:
+      raise ValueError(f"A lobby has 1 to {LOBBY_SIZE} survivors, not {len(survivors)}")
+    # Picks are returned by player id, so one id must not stand for two players
+    players = [*survivors, *([killer] if killer is not None else [])]
+    if len(set(players)) != len(players):
+      raise ValueError(f"Every player of a lobby needs a distinct id: {players}")
+    self.survivors = {player: CharacterSelector(config, rng) for player in survivors}
+    self.killer = killer
+    self.killer_selector = CharacterSelector(config, rng) if killer is not None else None
+    self.rng = rng or random
+    self.lock = asyncio.Lock()
+
+  async def draw(self, mode: str = None) -> dict:
+    '''Returns a character for every player of the lobby, with no survivor picked twice.'''
+    async with self.lock:
+      return self.draw_now(mode)
+
+  def draw_now(self, mode: str = None) -> dict:
+    '''Draws for every player without taking the lock, for callers that already hold it or run without a loop.'''
+    picks = {}
+    taken = set()
+    players = list(self.survivors)
+    # Vary who draws first, since later players draw around the characters already taken
+    self.rng.shuffle(players)
+    for player in players:
+      try:
+        character = self.survivors[player].pick('survivor', mode, avoid=taken)
+      except IndexError:
+        raise ValueError('Not enough included survivors for every player of the lobby') from None
+      taken.add(character)
+      picks[player] = character
+    if self.killer_selector is not None:
+      picks[self.killer] = self.killer_selector.pick('killer', mode)
+    return picks
+
+
+# The LobbyManager class keeps the active lobbies of an event loop.
+class LobbyManager:
+
+  def __init__(self, config: dict, rng=None) -> None:
+    """
+    Initializes the LobbyManager.
+
+    The rosters are interned once here and shared by the selectors of every
+    player of every lobby. There is no manager-wide lock: lobbies are only
+    added and removed between awaits on a single event loop.
+    """
+    self.config = dict(config, rosters=config.get('rosters') or build_rosters(config))
+    self.rng = rng
+    self.lobbies = {}
+
+  def __len__(self) -> int:
+    return len(self.lobbies)
+
+  def create(self, survivors: list, killer=None) -> str:
+    '''Creates a lobby and returns its id.'''
+    lobby_id = uuid.uuid4().hex
+    self.lobbies[lobby_id] = Lobby(self.config, survivors, killer, self.rng)
+    return lobby_id
+
+  def remove(self, lobby_id: str) -> None:
+    self.lobbies.pop(lobby_id, None)
+
+  async def draw(self, lobby_id: str, mode: str = None) -> dict:
+    '''Draws for every player of a lobby. Raises KeyError for an unknown lobby.'''
+    return await self.lobbies[lobby_id].draw(mode)
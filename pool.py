@@ -0,0 +1,218 @@
+import sys
+from array import array
+
+
+# The CharacterPool class holds the character ids of a cycle in one compact array with O(1) add, remove and random draw.
+class CharacterPool:
+
+  __slots__ = ('typecode', '_items', '_positions', '_drawable', '_absent')
+
+  def __init__(self, typecode: str = 'H') -> None:
+    """
+    Initializes the CharacterPool.
+
+    The ids still to draw this cycle fill the front of a dense array and the
+    ids already drawn fill the back, so a random draw is a single index lookup
+    and drawing an id swaps it across the boundary. A position array indexed
+    by id lets removal swap another id into the freed slot instead of shifting
+    the rest. Nothing is allocated for either array until the cycle starts.
+
+    Args:
+        typecode (str): The array typecode of the ids, wide enough for every id of the roster.
+    """
+    self.typecode = typecode
+    self._items = array(typecode)
+    self._positions = array(typecode)
+    self._drawable = 0
+    # The largest value of the typecode marks ids that are not in the pool
+    self._absent = (1 << (8 * self._items.itemsize)) - 1
+
+  def __len__(self) -> int:
+    '''Returns the number of ids still to draw.'''
+    return self._drawable
+
+  def __contains__(self, item) -> bool:
+    '''Returns whether an id is still to draw.'''
+    return 0 <= item < len(self._positions) and self._positions[item] < self._drawable
+
+  def __sizeof__(self) -> int:
+    return object.__sizeof__(self) + sys.getsizeof(self._items) + sys.getsizeof(self._positions)
+
+  @property
+  def started(self) -> bool:
+    '''Whether the pool holds a cycle, drawn or not.'''
+    return len(self._items) > 0
+
+  def drawn(self, item) -> bool:
+    '''Returns whether an id was already drawn this cycle.'''
+    if not 0 <= item < len(self._positions):
+      return False
+    position = self._positions[item]
+    return self._drawable <= position != self._absent
+
+  def drawable_ids(self) -> list:
+    return self._items[:self._drawable].tolist()
+
+  def drawn_ids(self) -> list:
+    return self._items[self._drawable:].tolist()
+
+  def _swap(self, i: int, j: int) -> None:
+    items = self._items
+    a = items[i]
+    b = items[j]
+    items[i] = b
+    items[j] = a
+    self._positions[b] = i
+    self._positions[a] = j
+
+  def _reserve(self, item: int) -> None:
+    if item >= len(self._positions):
+      self._positions.extend(array(self.typecode, [self._absent]) * (item + 1 - len(self._positions)))
+
+  def add(self, item: int) -> bool:
+    '''Adds an id to draw this cycle. Returns False if it was already in the pool, drawn or not.'''
+    self._reserve(item)
+    if self._positions[item] != self._absent:
+      return False
+    self._positions[item] = len(self._items)
+    self._items.append(item)
+    # Move it in front of the drawn ids
+    self._swap(len(self._items) - 1, self._drawable)
+    self._drawable += 1
+    return True
+
+  def discard(self, item: int) -> bool:
+    '''Removes an id from the pool, drawn or not. Returns False if it was not there.'''
+    if not 0 <= item < len(self._positions):
+      return False
+    position = self._positions[item]
+    if position == self._absent:
+      return False
+    if position < self._drawable:
+      # Move it to the drawn side first so the drawable ids stay in front
+      self._drawable -= 1
+      self._swap(position, self._drawable)
+      position = self._drawable
+    self._swap(position, len(self._items) - 1)
+    self._items.pop()
+    self._positions[item] = self._absent
+    return True
+
+  def add_all(self, items) -> None:
+    '''Adds many ids to draw this cycle, like add does for one, with the swaps inlined.'''
+    items = list(items)
+    if not items:
+      return
+    self._reserve(max(items))
+    pool = self._items
+    positions = self._positions
+    absent = self._absent
+    drawable = self._drawable
+    for item in items:
+      if positions[item] != absent:
+        continue
+      # Append it, then swap it with the first drawn id so the drawable ids stay in front
+      last = len(pool)
+      pool.append(item)
+      moved = pool[drawable]
+      pool[drawable] = item; pool[last] = moved
+      positions[moved] = last; positions[item] = drawable
+      drawable += 1
+    self._drawable = drawable
+
+  def discard_drawable(self, items) -> None:
+    '''Removes the given ids that are still to draw, like discard does for one, with the swaps inlined. Drawn ids stay drawn.'''
+    pool = self._items
+    positions = self._positions
+    absent = self._absent
+    drawable = self._drawable
+    size = len(positions)
+    for item in items:
+      if not 0 <= item < size:
+        continue
+      position = positions[item]
+      if position >= drawable:
+        continue
+      # Swap it with the last drawable id, then with the last id overall, and drop it
+      drawable -= 1
+      moved = pool[drawable]
+      pool[position] = moved; positions[moved] = position
+      pool[drawable] = item
+      last = len(pool) - 1
+      moved = pool[last]
+      pool[drawable] = moved; positions[moved] = drawable
+      pool.pop()
+      positions[item] = absent
+    self._drawable = drawable
+
+  def mark_drawn(self, item: int) -> None:
+    '''Moves an id to the drawn side of the pool, adding it first if it is not there.'''
+    self._reserve(item)
+    position = self._positions[item]
+    if position == self._absent:
+      self._positions[item] = position = len(self._items)
+      self._items.append(item)
+    if position < self._drawable:
+      self._drawable -= 1
+      self._swap(position, self._drawable)
+
+  def reset(self, items) -> None:
+    '''Starts a new cycle with the given ids, none of them drawn.'''
+    self._positions = array(self.typecode, [self._absent]) * len(self._positions)
+    self._items = array(self.typecode, items)
+    for position, item in enumerate(self._items):
+      self._reserve(item)
+      self._positions[item] = position
+    self._drawable = len(self._items)
+
+  def clear(self) -> None:
+    '''Forgets the cycle and releases both arrays.'''
+    self._items = array(self.typecode)
+    self._positions = array(self.typecode)
+    self._drawable = 0
+
+  def choice_excluding(self, rng, avoid) -> int:
+    """
+    Returns a random id still to draw that is not in avoid, without drawing it.
+
+    Args:
+        rng: A random number generator providing randrange (e.g. the random module).
+        avoid (collection): Ids that must not be returned.
+
+    Raises:
+        IndexError: If every id left to draw is avoided.
+    """
+    blocked = sorted(self._positions[i] for i in avoid if i is not None and i in self)
+    size = self._drawable - len(blocked)
+    if size <= 0:
+      raise IndexError('Cannot choose from an empty pool')
+    # Draw from the free slots and step over each blocked one, like draw does for a single id
+    index = rng.randrange(size)
+    for position in blocked:
+      if index >= position:
+        index += 1
+    return self._items[index]
+
+  def draw(self, rng, avoid=None) -> int:
+    '''Returns a random id still to draw, never avoid if any other id is left, and moves it to the drawn side.'''
+    size = self._drawable
+    if size == 0:
+      raise IndexError('Cannot choose from an empty pool')
+    items = self._items
+    positions = self._positions
+    # The swaps are inlined since this is the cycle mode hot path; absent ids sit past every drawable slot
+    if avoid is not None and size > 1 and avoid < len(positions) and positions[avoid] < size:
+      index = rng.randrange(size - 1)
+      if index >= positions[avoid]:
+        index += 1
+    else:
+      index = rng.randrange(size)
+    last = size - 1
+    item = items[index]
+    moved = items[last]
+    items[index] = moved
+    items[last] = item
+    positions[moved] = index
+    positions[item] = last
+    self._drawable = last
+    return item
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from weights import AliasTable
+
+# The most alias tables of different weights and exclusions a roster keeps for weight_table
+WEIGHT_TABLES = 8
+
+
+# The TeamRoster class interns the characters of a team as indices so sets of them can be stored as integer bitmasks.
+class TeamRoster:
+
+  def __init__(self, characters, team: str = None) -> None:
+    """
+    Initializes the TeamRoster.
+
+    Bit i of a mask stands for names[i]. Masks are plain Python integers, so
+    union, intersection and counting (int.bit_count) are single operations
+    however many characters are involved. A roster is built once and shared
+    by every selector, which only keep character ids into it. The interned
+    names tuple is the one record of each character: an id is its position
+    in names and index maps a name back to it.
+
+    Args:
+        characters (iterable): The characters of the team (duplicates are ignored, order is kept).
+        team (str): 'killer' or 'survivor'.
+
+    Attributes:
+        typecode (str): The smallest array typecode that holds every id.
+        presets (dict): Named exclusion masks of this roster, filled in by build_rosters.
+        weight_tables (OrderedDict): The shared alias tables of the most recently used weights and exclusions, see weight_table.
+    """
+    self.team = team
+    self.names = tuple(dict.fromkeys(characters))
+    self.index = {name: i for i, name in enumerate(self.names)}
+    self.members = frozenset(self.names)
+    self.full_mask = (1 << len(self.names)) - 1
+    # The largest value of a typecode marks absent ids in a CharacterPool, so it is never an id
+    self.typecode = 'B' if len(self.names) < 0xFF else 'H' if len(self.names) < 0xFFFF else 'I'
+    self.presets = {}
+    self.weight_tables = OrderedDict()
+
+  def __len__(self) -> int:
+    return len(self.names)
+
+  def __contains__(self, character) -> bool:
+    return character in self.index
+
+  def weight_table(self, weights: dict, excluded: int = 0) -> AliasTable:
+    """
+    Returns the alias table of roster ids for random picks with the given weights and exclusions.
+
+    The table only holds the characters that are not excluded, so a draw
+    never has to look at the exclusions. Selectors with the same weights and
+    exclusions share one table, and a table never changes once it is built,
+    so threads only ever read it. Building one is linear in the roster.
+
+    Args:
+        weights (dict): The weight by character; unlisted characters weigh 1.
+        excluded (int): The mask of excluded characters.
+    """
+    key = (frozenset(weights.items()), excluded)
+    table = self.weight_tables.get(key)
+    if table is None:
+      names = self.names
+      table = AliasTable({
+        i: weights.get(names[i], 1.0)
+        for i in self.indices(self.full_mask & ~excluded)
+      })
+      self.weight_tables[key] = table
+      if len(self.weight_tables) > WEIGHT_TABLES:
+        self.weight_tables.popitem(last=False)
+    else:
+      self.weight_tables.move_to_end(key)
+    return table
+
+  def bit(self, character: str) -> int:
+    '''Returns the mask of a single character.'''
+    return 1 << self.index[character]
+
+  def mask(self, characters) -> int:
+    '''Returns the mask of the given characters, ignoring any that are not on the roster.'''
+    # Setting digits of one binary string is linear, unlike growing a large mask bit by bit
+    bits = bytearray(b'0' * len(self.names))
+    for character in characters:
+      i = self.index.get(character)
+      if i is not None:
+        bits[-1 - i] = ord('1')
+    return int(bits, 2) if bits else 0
+
+  def preset_mask(self, characters, only: bool = False) -> int:
+    '''Returns the exclusion mask of a preset: the given characters, or everyone else when only is True.'''
+    mask = self.mask(characters)
+    return self.full_mask & ~mask if only else mask
+
+  def indices(self, mask: int) -> list:
+    '''Returns the indices of the bits set in a mask, in roster order.'''
+    # Reading the binary string once is linear, unlike shifting a large mask bit by bit
+    bits = bin(mask)[:1:-1]
+    return [i for i, bit in enumerate(bits) if bit == '1']
+
+  def characters(self, mask: int) -> list:
+    '''Returns the characters of a mask, in roster order.'''
+    names = self.names
+    return [names[i] for i in self.indices(mask)]
+
+  def remap(self, mask: int, other: 'TeamRoster') -> int:
+    '''Translates a mask of another roster to this roster, dropping characters this roster does not have.'''
+    return self.mask(other.characters(mask))
+
+
+def build_rosters(config: dict) -> dict:
+  '''Returns the TeamRoster of each team in a configuration, with the exclusion presets of the configuration.'''
+  rosters = {
+    'killer': TeamRoster(config['killers'], 'killer'),
+    'survivor': TeamRoster(config['survivors'], 'survivor')
+  }
+  for name, preset in config.get('presets', {}).items():
+    # An 'only' preset lists the characters to keep, so everyone else is excluded
+    rosters[preset['team']].presets[name] = rosters[preset['team']].preset_mask(preset['characters'], preset['only'])
+  return rosters
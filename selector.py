@@ -1,96 +1,457 @@
+import operator
 import random
+from functools import reduce
+from pool import CharacterPool
+from roster import TeamRoster, build_rosters
+
+# The fewest characters of a team that exclusions may leave to pick from
+MIN_INCLUDED = 3
 
 # The CharacterSelector class handles character selection based on user input and settings from a configuration file.
 class CharacterSelector:
 
   # The __init__ function initializes the CharacterSelector object with settings from the configuration file.
-  def __init__(self, config: dict) -> None:
+  def __init__(self, config: dict, rng=None) -> None:
     """
     Initializes the CharacterSelector object with settings from the configuration.
 
     Args:
         config (dict): A dictionary containing the configuration settings.
+        rng (random.Random): The random number generator for picks. Defaults to the random module.
 
     Attributes:
         config (dict): The configuration settings.
         selection_mode (bool): The selection mode from the configuration (True for random, False for cycling).
         last_selected_team (bool): The last selected team (True for survivors, False for killers).
-        config_characters (dict): A dictionary of characters for each team from the configuration (no duplicates).
-        remaining_characters (dict): A dictionary of remaining characters for each team.
-        selected_characters (dict): A dictionary of selected characters for each team.
-        excluded_characters (dict): A dictionary of excluded characters for each team.
-        previous_selection (dict): A dictionary to store the previous selection for each team.
+        rosters (dict): The TeamRoster of each team. Taken from config['rosters'] when present so selectors can share them.
+        config_characters (dict): A frozenset of characters for each team from the configuration, shared with the rosters.
+        pools (dict): The CharacterPool of roster ids per team, holding the current cycle's picked and not yet picked characters.
+        excluded_masks (dict): A bitmask per team of excluded characters over the team's roster.
+        presets (dict): A dictionary per team of named exclusion masks, shared with the roster until one is defined.
+        previous_ids (dict): The roster id of the previous selection for each team, or None.
+        weights (dict): A dictionary per team of random mode weights by character (unlisted characters weigh 1).
+        weight_tables (dict): The alias table of the included roster ids per team used for random picks, shared through
+            the roster by every selector with the same weights and exclusions, and fetched again on the first random
+            pick after either changed.
+        listeners (list): Callables notified of every state change as listener(event, team, character).
+
+    The selector only holds ids, masks and the pool arrays, and names are looked
+    up in the shared roster when a pick is reported. A fresh selector is a few
+    KB of dictionaries, but once a cycle starts each pool holds two arrays as
+    long as the roster. A pick keeps nothing it allocates.
     """
     self.config = config
+    self.rng = rng or random
     self.selection_mode = config['mode']
     self.last_selected_team = config['team']
+    self.rosters = dict(config.get('rosters') or build_rosters(config))
     self.config_characters = {
-      'killer': set(config['killers']),
-      'survivor': set(config['survivors'])
+      team: roster.members
+      for team, roster in self.rosters.items()
+    }
+    self.pools = {
+      team: CharacterPool(roster.typecode)
+      for team, roster in self.rosters.items()
+    }
+    self.excluded_masks = {'killer': 0, 'survivor': 0}
+    self.presets = {
+      team: roster.presets
+      for team, roster in self.rosters.items()
+    }
+    self.previous_ids = {'killer': None, 'survivor': None}
+    self.weights = {
+      'killer': config.get('killer_weights', {}),
+      'survivor': config.get('survivor_weights', {})
     }
-    self.unselected_characters = {'killer': [], 'survivor': []}
-    self.selected_characters = {'killer': [], 'survivor': []}
-    self.excluded_characters = {'killer': [], 'survivor': []}
-    self.previous_selection = {'killer': None, 'survivor': None}
+    self.weight_tables = {'killer': None, 'survivor': None}
+    self.listeners = []
+
+  def _notify(self, event: str, team: str, character: str = None) -> None:
+    """
+    Tells every listener about a state change.
+
+    Events are 'random' and 'cycle' for picks in each mode, 'reset' when a new
+    cycle starts, 'exclude' and 'include' for exclusions, 'exclusions' after
+    set_excluded_mask replaced the exclusions of a team, 'roster' after the
+    roster of a team changed, and 'batch' after sample_batch replaced the state
+    of a team (character is the last pick).
+    """
+    for listener in self.listeners:
+      listener(event, team, character)
+
+  @property
+  def previous_selection(self) -> dict:
+    """The name of the previous selection of each team, or None."""
+    return {
+      team: None if i is None else self.rosters[team].names[i]
+      for team, i in self.previous_ids.items()
+    }
+
+  def remaining_characters(self, team: str) -> list:
+    """Returns the characters not yet picked in the current cycle of a team, in no particular order."""
+    names = self.rosters[team].names
+    return [names[i] for i in self.pools[team].drawable_ids()]
+
+  def picked_characters(self, team: str) -> list:
+    """Returns the characters already picked in the current cycle of a team, in no particular order."""
+    names = self.rosters[team].names
+    return [names[i] for i in self.pools[team].drawn_ids()]
 
   def print_character_selection(self, character: str) -> None:
     '''The print_character_selection function prints the chosen character and their team (Killer or Survivor).'''
     # Determine the team based on whether the character is in the survivors list
     team = "Survivor" if character in self.config_characters[
       'survivor'] else "Killer"
-    self.previous_selection[team.lower()] = character
+    self.previous_ids[team.lower()] = self.rosters[team.lower()].index[character]
     # If the team is "Killer", add "The" before the character's name
     if team == "Killer":
       character = "The " + character
     # Print the chosen character and their team
     print(f'Play {team}: {character}!\n')
 
-  def _update_team_info(self, user_choice: str) -> tuple[str, list[str]]:
-    """Return team and team list based on the user's input."""
+  def _update_team(self, user_choice: str) -> str:
+    """Return the team based on the user's input."""
     if user_choice != '':
       self.last_selected_team = True if user_choice == '1' else False
 
-    team = "survivor" if self.last_selected_team else "killer"
-    team_list = list(self.config_characters[team])
+    return "survivor" if self.last_selected_team else "killer"
+
+  @property
+  def excluded_characters(self) -> dict:
+    """The excluded characters of each team in roster order, decoded from the exclusion masks."""
+    return {
+      team: self.rosters[team].characters(mask)
+      for team, mask in self.excluded_masks.items()
+    }
+
+  def excluded_count(self, team: str) -> int:
+    return self.excluded_masks[team].bit_count()
+
+  def included_count(self, team: str) -> int:
+    return len(self.rosters[team]) - self.excluded_masks[team].bit_count()
+
+  def exclude_character(self, team: str, character: str) -> None:
+    """Exclude a character of the given team from selection."""
+    i = self.rosters[team].index[character]
+    self.excluded_masks[team] |= 1 << i
+    self.weight_tables[team] = None
+    pool = self.pools[team]
+    # Picked characters stay picked for this cycle, so an include does not hand them out again
+    if i in pool:
+      pool.discard(i)
+    if self.listeners:
+      self._notify('exclude', team, character)
+
+  def include_character(self, team: str, character: str) -> None:
+    """Stop excluding a character of the given team."""
+    i = self.rosters[team].index[character]
+    self.excluded_masks[team] &= ~(1 << i)
+    self.weight_tables[team] = None
+    pool = self.pools[team]
+    # Only return the character to a cycle that has started and has not picked them yet
+    if pool.started and not pool.drawn(i):
+      pool.add(i)
+    if self.listeners:
+      self._notify('include', team, character)
+
+  def clear_excluded_characters(self, team: str) -> None:
+    """Stop excluding every character of the given team."""
+    self.set_excluded_mask(team, 0)
+
+  def set_excluded_mask(self, team: str, mask: int) -> None:
+    """
+    Replaces the exclusions of a team with a mask.
+
+    The mask is swapped in as one integer and only the characters whose bit
+    changed are moved in or out of the cycle, so the cost follows the number
+    of changes. Listeners get a single 'exclusions' event instead of one
+    'exclude' or 'include' per character.
+    """
+    roster = self.rosters[team]
+    mask &= roster.full_mask
+    changed = self.excluded_masks[team] ^ mask
+    if not changed:
+      return
+    self.excluded_masks[team] = mask
+    self.weight_tables[team] = None
+    pool = self.pools[team]
+    # Picked characters stay picked for this cycle, so an include does not hand them out again
+    pool.discard_drawable(roster.indices(changed & mask))
+    if pool.started:
+      pool.add_all(roster.indices(changed & ~mask))
+    if self.listeners:
+      self._notify('exclusions', team)
+
+  def define_preset(self, team: str, name: str, characters, only: bool = False) -> None:
+    """Stores a named exclusion mask: the given characters, or everyone else when only is True."""
+    # The presets dictionary may be shared with the roster and other selectors
+    self.presets[team] = {**self.presets[team], name: self.rosters[team].preset_mask(characters, only)}
+
+  def update_presets(self, team: str, presets: dict) -> None:
+    """
+    Replaces the presets of a team with those of a configuration.
+
+    Args:
+        team (str): The team whose presets are replaced.
+        presets (dict): The presets by name as parsed from a configuration file
+            (see parse_presets). Presets of the other team are ignored.
+    """
+    roster = self.rosters[team]
+    self.presets[team] = {
+      name: roster.preset_mask(preset['characters'], preset['only'])
+      for name, preset in presets.items()
+      if preset['team'] == team
+    }
+
+  def preset_mask(self, team: str, *names: str, combine: str = 'union') -> int:
+    """Returns the union or intersection of the named presets of a team."""
+    if combine not in ('union', 'intersection'):
+      raise ValueError(f"Unknown preset combination: {combine}")
+    masks = [self.presets[team][name] for name in names]
+    return reduce(operator.or_ if combine == 'union' else operator.and_, masks)
+
+  def apply_preset(self, team: str, *names: str, combine: str = 'union') -> None:
+    """Replaces the exclusions of a team with one preset, or the union or intersection of several."""
+    self.set_excluded_mask(team, self.preset_mask(team, *names, combine=combine))
+
+  def update_roster(self, team: str, characters) -> bool:
+    """
+    Replaces the roster of a team while keeping the progress of the current cycle.
+
+    Only the difference to the old roster is applied: removed characters leave
+    the cycle and the exclusions, and added characters join the cycle in
+    progress unless it has not started yet. If the exclusions would leave
+    fewer than MIN_INCLUDED characters of the new roster, they are dropped and
+    the excluded characters rejoin the cycle too.
+
+    Returns:
+        bool: Whether the exclusions were dropped.
+    """
+    old_roster = self.rosters[team]
+    roster = TeamRoster(characters, team)
+    old = old_roster.members
+    new = roster.members
+    if new == old:
+      return False
+
+    # Masks and ids are only meaningful for the roster they were made for
+    excluded = roster.remap(self.excluded_masks[team], old_roster)
+    dropped = len(roster) - excluded.bit_count() < MIN_INCLUDED
+    self.excluded_masks[team] = 0 if dropped else excluded
+    self.presets[team] = {
+      name: roster.remap(mask, old_roster)
+      for name, mask in self.presets[team].items()
+    }
+    old_pool = self.pools[team]
+    pool = CharacterPool(roster.typecode)
+    if old_pool.started:
+      for i in old_pool.drawable_ids():
+        if old_roster.names[i] in new:
+          pool.add(roster.index[old_roster.names[i]])
+      for i in old_pool.drawn_ids():
+        if old_roster.names[i] in new:
+          pool.mark_drawn(roster.index[old_roster.names[i]])
+      # New characters are never excluded yet
+      for character in new - old:
+        pool.add(roster.index[character])
+      if dropped:
+        pool.add_all(roster.indices(excluded))
+    previous = self.previous_ids[team]
+    if previous is not None:
+      self.previous_ids[team] = roster.index.get(old_roster.names[previous])
+    self.pools[team] = pool
+    self.rosters[team] = roster
+    self.weight_tables[team] = None
+
+    self.config_characters[team] = new
+    if self.listeners:
+      self._notify('roster', team)
+    return dropped
+
+  def set_weight(self, team: str, character: str, weight: float) -> None:
+    """Changes the random mode weight of one character without rebuilding the other weights."""
+    if character not in self.config_characters[team]:
+      raise KeyError(character)
+    if weight < 0:
+      raise ValueError(f"Weight of {character} must not be negative: {weight}")
+    # The weights dictionary and the alias table may be shared with other selectors
+    self.weights[team] = {**self.weights[team], character: weight}
+    self.weight_tables[team] = None
+
+  def update_weights(self, team: str, weights: dict) -> None:
+    """Replaces the random mode weights of a team. The alias table is fetched again on the next random pick."""
+    self.weights[team] = weights
+    self.weight_tables[team] = None
 
-    return team, team_list
+  def _weight_table(self, team: str):
+    table = self.weight_tables[team]
+    if table is None:
+      table = self.weight_tables[team] = self.rosters[team].weight_table(self.weights[team], self.excluded_masks[team])
+    return table
+
+  def _reset_cycle(self, team: str) -> None:
+    """Start a new cycle with every character of the team that is not excluded."""
+    roster = self.rosters[team]
+    self.pools[team].reset(roster.indices(roster.full_mask & ~self.excluded_masks[team]))
+    if self.listeners:
+      self._notify('reset', team)
 
   def random_character(self, user_choice: str) -> None:
     '''The random_character function selects a random character from the current team without repeating the previous selection.'''
-    team, team_list = self._update_team_info(user_choice)
-
-    # Choose a random character from the team list, excluding the previously selected character for the current team
-    character = random.choice([
-      i for i in team_list if i != self.previous_selection[team]
-      and i not in self.excluded_characters[team]
-    ])
+    team = self._update_team(user_choice)
     # Print the chosen character and their team
-    self.print_character_selection(character)
+    self.print_character_selection(self._random_pick(team))
 
   def cycle_characters(self, user_choice: str) -> None:
-    team, team_list = self._update_team_info(user_choice)
+    team = self._update_team(user_choice)
+    self.print_character_selection(self._cycle_pick(team))
+
+  def pick(self, team: str, mode: str = None, avoid=()) -> str:
+    """
+    Selects a character of a team without printing it.
+
+    Args:
+        team (str): The team to pick from ('killer' or 'survivor').
+        mode (str): 'random' or 'cycle'. Defaults to the current selection mode.
+        avoid (collection): Characters that must not be picked this time, e.g.
+            ones already taken by other players. In cycle mode a new cycle
+            starts when only avoided characters are left in the current one.
+
+    Returns:
+        str: The picked character.
+    """
+    if mode is None:
+      mode = 'random' if self.selection_mode else 'cycle'
+    if mode == 'random':
+      return self._random_pick(team, avoid)
+    if mode == 'cycle':
+      return self._cycle_pick(team, avoid)
+    raise ValueError(f"Unknown selection mode: {mode}")
 
-    unselected = self.unselected_characters[team]
-    selected = self.selected_characters[team]
-    available = [
-      i for i in unselected if i != self.previous_selection[team]
-      and i not in selected and i not in self.excluded_characters[team]]
+  def _avoided_ids(self, team: str, avoid) -> list:
+    index = self.rosters[team].index
+    return [index[character] for character in avoid if character in index]
 
-    if not available:
-      unselected = self.unselected_characters[team] = team_list
-      selected = self.selected_characters[team] = []
-      available = [
-        i for i in unselected if i != self.previous_selection[team]
-        and i not in selected and i not in self.excluded_characters[team]]
+  def _random_pick(self, team: str, avoid=()) -> str:
+    # Choose a weighted random character from the team, excluding the previously selected character for the current team
+    i = self._weight_table(team).sample(
+      self.rng, avoid=self.previous_ids[team],
+      others=self._avoided_ids(team, avoid) if avoid else ())
+    self.previous_ids[team] = i
+    character = self.rosters[team].names[i]
+    if self.listeners:
+      self._notify('random', team, character)
+    return character
+
+  def _cycle_pick(self, team: str, avoid=()) -> str:
+    pool = self.pools[team]
+    previous = self.previous_ids[team]
+
+    if avoid:
+      return self._cycle_pick_avoiding(team, {previous, *self._avoided_ids(team, avoid)})
+
+    # Start a new cycle once nobody but the previous pick is left to draw
+    size = len(pool)
+    if size == 0 or (size == 1 and previous is not None and previous in pool):
+      self._reset_cycle(team)
 
     #if debug == True:
-    #print("Available characters:", available)
-    #print("Unselected characters:", unselected)
-    #print("Selected characters:", selected)
+    #print("Unselected characters:", self.remaining_characters(team))
+    #print("Selected characters:", self.picked_characters(team))
     #print("Excluded characters:", self.excluded_characters[team])
     #input("")
 
-    character = random.choice(available)
-    unselected.remove(character)
-    selected.append(character)
-    self.print_character_selection(character)
+    i = pool.draw(self.rng, avoid=previous)
+    self.previous_ids[team] = i
+    character = self.rosters[team].names[i]
+    if self.listeners:
+      self._notify('cycle', team, character)
+    return character
+
+  def _cycle_pick_avoiding(self, team: str, avoid: set) -> str:
+    pool = self.pools[team]
+    avoid.discard(None)
+    # Start a new cycle once nobody but avoided characters is left to draw
+    if len(pool) <= sum(i in pool for i in avoid):
+      self._reset_cycle(team)
+
+    i = pool.choice_excluding(self.rng, avoid)
+    pool.mark_drawn(i)
+    self.previous_ids[team] = i
+    character = self.rosters[team].names[i]
+    if self.listeners:
+      self._notify('cycle', team, character)
+    return character
+
+  def sample_batch(self, team: str, n: int, mode: str = None, rng=None):
+    """
+    Draws n characters of a team in one vectorized pass without printing them.
+
+    The picks follow the same rules as random_character and cycle_characters
+    (no back-to-back repeats, no repeats within a cycle, excluded characters
+    are skipped) and the selector continues from the last pick afterwards.
+    Random mode draws with the same weights as random_character.
+
+    Args:
+        team (str): The team to draw from ('killer' or 'survivor').
+        n (int): The number of picks.
+        mode (str): 'random' or 'cycle'. Defaults to the current selection mode.
+        rng: A numpy Generator or seed for the draws.
+
+    Returns:
+        np.ndarray: The picked character names in order.
+    """
+    # numpy is only needed here, so plain picks do not pay for importing it
+    import numpy as np
+    from batch import cycle_picks, random_picks, weighted_random_picks
+
+    if mode is None:
+      mode = 'random' if self.selection_mode else 'cycle'
+    if mode not in ('random', 'cycle'):
+      raise ValueError(f"Unknown selection mode: {mode}")
+    rng = np.random.default_rng(rng)
+
+    roster = self.rosters[team]
+    candidates = roster.indices(roster.full_mask & ~self.excluded_masks[team])
+    index = {i: position for position, i in enumerate(candidates)}
+    previous = index.get(self.previous_ids[team], -1)
+    ids = np.array(candidates, dtype=np.intp)
+    names = np.array([roster.names[i] for i in candidates])
+
+    if n == 0:
+      return names[:0]
+
+    if mode == 'random':
+      weights = self.weights[team]
+      if any(character in self.config_characters[team] and weight != 1.0 for character, weight in weights.items()):
+        picks = weighted_random_picks(
+          np.array([weights.get(roster.names[i], 1.0) for i in candidates], dtype=float), n, previous, rng)
+      else:
+        picks = random_picks(len(candidates), n, previous, rng)
+    else:
+      pool = self.pools[team]
+      drawable = pool.drawable_ids()
+      previous_id = self.previous_ids[team]
+      # Whether the picks run past the cycle in progress into new cycles
+      new_cycle = n > len(pool) or (
+        len(pool) == 1 and previous_id is not None and previous_id in pool)
+      picks, remaining = cycle_picks(
+        len(candidates), n,
+        np.fromiter((index[i] for i in drawable), dtype=np.intp,
+                    count=len(drawable)), previous, rng)
+      # Carry the cycle in progress over to the next pick
+      if not new_cycle:
+        for i in ids[picks].tolist():
+          pool.mark_drawn(i)
+      else:
+        remaining = set(ids[remaining].tolist())
+        pool.reset(candidates)
+        for i in candidates:
+          if i not in remaining:
+            pool.mark_drawn(i)
+
+    result = names[picks]
+    self.previous_ids[team] = int(ids[picks[-1]])
+    if self.listeners:
+      self._notify('batch', team, roster.names[self.previous_ids[team]])
+    return result
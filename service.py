@@ -0,0 +1,355 @@
+import argparse
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, Response, jsonify, request
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+from config import initialize_config
+from events import POLICIES, EventBus
+from roster import build_rosters
+from selector import MIN_INCLUDED, CharacterSelector
+
+TEAMS = ('killer', 'survivor')
+
+
+def selector_size(selector: CharacterSelector) -> int:
+  """Returns an estimate in bytes of the per-session state of a selector (the shared roster and alias tables are not counted)."""
+  size = sys.getsizeof(selector.__dict__)
+  # The per-team dictionaries themselves, whatever they hold
+  size += sum(sys.getsizeof(value) for value in vars(selector).values() if isinstance(value, dict))
+  for team in TEAMS:
+    size += sys.getsizeof(selector.pools[team])
+    size += sys.getsizeof(selector.excluded_masks[team])
+  return size
+
+
+# The Session class pairs a selector with the lock that serializes requests against it.
+class Session:
+
+  def __init__(self, session_id: str, selector: CharacterSelector) -> None:
+    self.id = session_id
+    self.selector = selector
+    self.lock = threading.Lock()
+    self.last_used = time.monotonic()
+    self.size = selector_size(selector)
+
+
+# The SessionStore class keeps one CharacterSelector per session with LRU, TTL and memory based eviction.
+class SessionStore:
+
+  def __init__(self,
+               config: dict,
+               max_sessions: int = 10000,
+               ttl: float = 3600.0,
+               max_bytes: int = 64 * 1024 * 1024,
+               bus: EventBus = None) -> None:
+    """
+    Initializes the SessionStore.
+
+    The rosters are interned once here, so every session's selector
+    references the same roster instead of holding its own copy. Every
+    selector publishes its events to the bus, tagged with the session id.
+
+    Args:
+        config (dict): The configuration settings shared by every session.
+        max_sessions (int): The maximum number of live sessions.
+        ttl (float): The number of idle seconds after which a session expires.
+        max_bytes (int): The estimated memory budget for all session state.
+        bus (EventBus): The event bus of the selectors. Defaults to a new one.
+    """
+    self.config = dict(config, rosters=build_rosters(config))
+    self.bus = bus or EventBus()
+    self.max_sessions = max_sessions
+    self.ttl = ttl
+    self.max_bytes = max_bytes
+    self.total_bytes = 0
+    self._sessions = OrderedDict()
+    self._lock = threading.Lock()
+
+  def __len__(self) -> int:
+    return len(self._sessions)
+
+  def create(self) -> str:
+    '''Creates a new session and returns its id.'''
+    session_id = uuid.uuid4().hex
+    selector = CharacterSelector(self.config)
+    selector.listeners.append(self.bus.listener(session_id))
+    session = Session(session_id, selector)
+    with self._lock:
+      self._sessions[session_id] = session
+      self.total_bytes += session.size
+      self._evict(time.monotonic())
+    return session_id
+
+  def get(self, session_id: str):
+    '''Returns the session with the given id and marks it as recently used, or None if it does not exist.'''
+    now = time.monotonic()
+    with self._lock:
+      session = self._sessions.get(session_id)
+      if session is None:
+        return None
+      if now - session.last_used > self.ttl:
+        self._remove(session_id)
+        return None
+      session.last_used = now
+      self._sessions.move_to_end(session_id)
+      return session
+
+  def delete(self, session_id: str) -> bool:
+    with self._lock:
+      if session_id not in self._sessions:
+        return False
+      self._remove(session_id)
+      return True
+
+  def resize(self, session: Session) -> None:
+    '''Updates the memory estimate of a session after its state changed and evicts if over budget.'''
+    size = selector_size(session.selector)
+    with self._lock:
+      # A session evicted while its request ran no longer counts towards total_bytes
+      if self._sessions.get(session.id) is not session:
+        return
+      self.total_bytes += size - session.size
+      session.size = size
+      self._evict(time.monotonic())
+
+  def _remove(self, session_id: str) -> None:
+    session = self._sessions.pop(session_id)
+    self.total_bytes -= session.size
+
+  def _evict(self, now: float) -> None:
+    # Sessions are kept in least recently used order, so expired ones are always at the front
+    while self._sessions:
+      session_id, session = next(iter(self._sessions.items()))
+      if (now - session.last_used > self.ttl
+          or len(self._sessions) > self.max_sessions
+          or self.total_bytes > self.max_bytes):
+        self._remove(session_id)
+      else:
+        break
+
+
+# The PooledWSGIServer class serves connections on a fixed pool of worker threads instead of a new thread per connection.
+class PooledWSGIServer(BaseWSGIServer):
+
+  multithread = True
+
+  def __init__(self, host: str, port: int, app, threads: int = 64, idle_timeout: float = 30.0, **kwargs) -> None:
+    """
+    Initializes the PooledWSGIServer.
+
+    A connection holds its worker for as long as it stays open, between the
+    requests of a keep-alive connection and for the whole of an event
+    stream, so connections past the number of threads wait in line until a
+    worker is free. A keep-alive connection that stays idle for idle_timeout
+    seconds is closed to hand its worker back.
+
+    Args:
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        app: The WSGI application.
+        threads (int): The number of worker threads.
+        idle_timeout (float): The number of seconds a connection may wait for its next request.
+        **kwargs: Passed on to BaseWSGIServer.
+    """
+    handler = type('PooledRequestHandler', (WSGIRequestHandler,), {
+      # Keep connections alive so clients do not pay for a new socket per pick
+      'protocol_version': 'HTTP/1.1',
+      'timeout': idle_timeout
+    })
+    super().__init__(host, port, app, handler, **kwargs)
+    self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='service')
+
+  def process_request(self, request, client_address) -> None:
+    self.executor.submit(self._process_request, request, client_address)
+
+  def _process_request(self, request, client_address) -> None:
+    try:
+      self.finish_request(request, client_address)
+    except Exception:
+      self.handle_error(request, client_address)
+    finally:
+      self.shutdown_request(request)
+
+  def server_close(self) -> None:
+    super().server_close()
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_app(store: SessionStore, keepalive: float = 15.0) -> Flask:
+  app = Flask(__name__)
+
+  def error(message, status):
+    return jsonify({'error': message}), status
+
+  def team_from(body, selector):
+    team = body.get('team')
+    if team is None:
+      return 'survivor' if selector.last_selected_team else 'killer'
+    if team not in TEAMS:
+      raise ValueError(f"Unknown team: {team}")
+    return team
+
+  def character_from(body, selector, team):
+    character = body.get('character')
+    if character not in selector.config_characters[team]:
+      raise ValueError(f"Unknown {team} character: {character}")
+    return character
+
+  @app.errorhandler(ValueError)
+  def bad_request(e):
+    return error(str(e), 400)
+
+  @app.post('/sessions')
+  def create_session():
+    return jsonify({'session': store.create()}), 201
+
+  @app.get('/sessions/<session_id>')
+  def get_session(session_id):
+    session = store.get(session_id)
+    if session is None:
+      return error('Session not found', 404)
+    selector = session.selector
+    with session.lock:
+      return jsonify({
+        'mode': 'random' if selector.selection_mode else 'cycle',
+        'team': 'survivor' if selector.last_selected_team else 'killer',
+        'previous': selector.previous_selection,
+        'excluded': {
+          team: sorted(selector.excluded_characters[team])
+          for team in TEAMS
+        },
+        'remaining': {
+          team: len(selector.pools[team])
+          for team in TEAMS
+        },
+      })
+
+  @app.delete('/sessions/<session_id>')
+  def delete_session(session_id):
+    if not store.delete(session_id):
+      return error('Session not found', 404)
+    return '', 204
+
+  @app.post('/sessions/<session_id>/pick')
+  def pick(session_id):
+    session = store.get(session_id)
+    if session is None:
+      return error('Session not found', 404)
+    body = request.get_json(silent=True) or {}
+    with session.lock:
+      team = team_from(body, session.selector)
+      character = session.selector.pick(team, body.get('mode'))
+    store.resize(session)
+    return jsonify({'team': team, 'character': character})
+
+  @app.post('/sessions/<session_id>/exclude')
+  def exclude(session_id):
+    session = store.get(session_id)
+    if session is None:
+      return error('Session not found', 404)
+    body = request.get_json(silent=True) or {}
+    selector = session.selector
+    with session.lock:
+      team = team_from(body, selector)
+      character = character_from(body, selector, team)
+      roster = selector.rosters[team]
+      if len(roster) - (selector.excluded_masks[team] | roster.bit(character)).bit_count() < MIN_INCLUDED:
+        return error(f'At least {MIN_INCLUDED} characters must stay included', 409)
+      selector.exclude_character(team, character)
+    store.resize(session)
+    return jsonify({'team': team, 'excluded': character})
+
+  @app.post('/sessions/<session_id>/include')
+  def include(session_id):
+    session = store.get(session_id)
+    if session is None:
+      return error('Session not found', 404)
+    body = request.get_json(silent=True) or {}
+    selector = session.selector
+    with session.lock:
+      team = team_from(body, selector)
+      if body.get('character') is None:
+        selector.clear_excluded_characters(team)
+      else:
+        selector.include_character(team, character_from(body, selector, team))
+    store.resize(session)
+    return jsonify({'team': team})
+
+  @app.get('/events')
+  def events():
+    session_id = request.args.get('session')
+    policy = request.args.get('policy')
+    if policy is not None and policy not in POLICIES:
+      return error(f"Unknown policy: {policy}", 400)
+    if session_id is not None and store.get(session_id) is None:
+      return error('Session not found', 404)
+    try:
+      subscription = store.bus.subscribe(policy=policy, session=session_id)
+    except OverflowError as e:
+      return error(str(e), 503)
+
+    def stream():
+      try:
+        # Tell the client the stream is open before the first event
+        yield b': connected\n\n'
+        while not subscription.closed:
+          frames = subscription.get(keepalive)
+          # A comment line doubles as a keepalive that finds closed connections
+          yield b''.join(frames) if frames else b': keepalive\n\n'
+      finally:
+        store.bus.unsubscribe(subscription)
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+      'Cache-Control': 'no-cache',
+      'X-Accel-Buffering': 'no'
+    })
+
+  @app.get('/stats')
+  def stats():
+    return jsonify({'sessions': len(store), 'bytes': store.total_bytes, 'subscribers': len(store.bus)})
+
+  return app
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Serve character picks for many sessions over HTTP.')
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=5000)
+  parser.add_argument('--config', default='settings.ini')
+  parser.add_argument('--max-sessions', type=int, default=10000)
+  parser.add_argument('--ttl', type=float, default=3600.0)
+  parser.add_argument('--max-mb', type=float, default=64.0)
+  parser.add_argument('--threads', type=int, default=64, help='worker threads, each serving one connection at a time')
+  parser.add_argument('--max-subscribers', type=int, default=None,
+                      help='event streams at once (defaults to half the threads, so streams cannot take every worker)')
+  parser.add_argument('--quiet', action='store_true', help='disable the per-request access log')
+  args = parser.parse_args()
+
+  if args.quiet:
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+  max_subscribers = args.max_subscribers if args.max_subscribers is not None else args.threads // 2
+  store = SessionStore(initialize_config(args.config),
+                       max_sessions=args.max_sessions,
+                       ttl=args.ttl,
+                       max_bytes=int(args.max_mb * 1024 * 1024),
+                       bus=EventBus(max_subscribers=max_subscribers))
+  server = PooledWSGIServer(args.host, args.port, create_app(store), threads=args.threads)
+  print(f" * Serving on http://{args.host}:{server.server_port} with {args.threads} worker threads")
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+
+
+if __name__ == '__main__':
+  main()
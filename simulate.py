@@ -0,0 +1,201 @@
+import argparse
+import json
+import math
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import get_config_file_path, load_config
+from selector import CharacterSelector
+
+
+def simulate_chunk(config: dict, team: str, mode: str, excluded: list,
+                   sessions: int, picks: int, seed: np.random.SeedSequence) -> dict:
+  """
+  Runs a number of simulated sessions and returns their merged histograms.
+
+  Every session starts from a fresh selector and makes picks picks. Only the
+  histograms leave the worker, never the individual picks.
+
+  Returns:
+      dict: 'frequency' (picks per character), 'gaps' (picks between two picks
+      of the same character, by gap length), 'back_to_back' (picks equal to the
+      one before), 'resets' (cycle resets), 'sessions' and 'picks'.
+  """
+  rng = random.Random(int.from_bytes(seed.generate_state(4).tobytes(), 'little'))
+  frequency = Counter()
+  gaps = Counter()
+  back_to_back = 0
+  resets = 0
+
+  def count_resets(event, team, character):
+    nonlocal resets
+    if event == 'reset':
+      resets += 1
+
+  for _ in range(sessions):
+    selector = CharacterSelector(config, rng=rng)
+    for character in excluded:
+      selector.exclude_character(team, character)
+    selector.listeners.append(count_resets)
+
+    last_seen = {}
+    previous = None
+    for i in range(picks):
+      character = selector.pick(team, mode)
+      frequency[character] += 1
+      seen = last_seen.get(character)
+      if seen is not None:
+        gaps[i - seen] += 1
+      last_seen[character] = i
+      if character == previous:
+        back_to_back += 1
+      previous = character
+
+  return {
+    'frequency': frequency,
+    'gaps': gaps,
+    'back_to_back': back_to_back,
+    'resets': resets,
+    'sessions': sessions,
+    'picks': sessions * picks,
+  }
+
+
+def merge(total: dict, result: dict) -> None:
+  '''Adds the histograms of one chunk to the running totals.'''
+  total['frequency'].update(result['frequency'])
+  total['gaps'].update(result['gaps'])
+  for key in ('back_to_back', 'resets', 'sessions', 'picks'):
+    total[key] += result[key]
+
+
+def expected_counts(weights: list, picks: int) -> np.ndarray:
+  """
+  Returns the expected number of picks of each character in one random mode session.
+
+  A random pick draws a character in proportion to its weight, but never the
+  previous pick, so a heavy character comes up less often than its share of
+  the weights. This follows the distribution of every pick in turn from the
+  first one, which has no previous pick.
+
+  Args:
+      weights (list): The weight of each character.
+      picks (int): The number of picks in a session.
+  """
+  weights = np.asarray(weights, dtype=float)
+  total = weights.sum()
+  # The chance of drawing j after i is weights[j] / (total - weights[i]) for j != i
+  others = np.where(weights < total, total - weights, np.inf)
+  share = weights / total
+  expected = np.zeros_like(weights)
+  for _ in range(picks):
+    expected += share
+    leaving = share / others
+    share = weights * (leaving.sum() - leaving)
+  return expected
+
+
+def summarize(total: dict, roster: list, weights: list = None) -> dict:
+  """
+  Returns fairness statistics for merged histograms.
+
+  Args:
+      total (dict): The merged histograms.
+      roster (list): The characters that could be picked.
+      weights (list): The random mode weight of each character of roster. The
+          expected counts follow them and the no back-to-back rule; without
+          them every character is expected equally often, as in cycle mode.
+  """
+  counts = np.array([total['frequency'].get(character, 0) for character in roster], dtype=float)
+  if weights is None:
+    expected = np.full(len(roster), total['picks'] / len(roster))
+  else:
+    expected = expected_counts(weights, total['picks'] // total['sessions']) * total['sessions']
+  # Characters that weigh 0 are never picked, so they take no part in the test
+  positive = expected > 0
+  shares = counts[positive] / expected[positive]
+  chi_square = float(((counts[positive] - expected[positive])**2 / expected[positive]).sum())
+  gap_count = sum(total['gaps'].values())
+  return {
+    'sessions': total['sessions'],
+    'picks': total['picks'],
+    'characters': len(roster),
+    'weighted': weights is not None,
+    'min_expected': float(expected[positive].min()),
+    'max_expected': float(expected[positive].max()),
+    # The picks of each character over its expected count
+    'min_share': float(shares.min()),
+    'max_share': float(shares.max()),
+    # Compare with the degrees of freedom: far above them means unfair
+    'chi_square': chi_square,
+    'degrees_of_freedom': int(positive.sum()) - 1,
+    'unexpected_picks': int(counts[~positive].sum()),
+    'mean_gap': sum(gap * n for gap, n in total['gaps'].items()) / gap_count if gap_count else math.nan,
+    'min_gap': min(total['gaps'], default=None),
+    'max_gap': max(total['gaps'], default=None),
+    'back_to_back': total['back_to_back'],
+    'resets': total['resets'],
+  }
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description='Simulate many selection sessions across processes and report how fair the picks are.')
+  parser.add_argument('--config', default='settings.ini')
+  parser.add_argument('--team', choices=['killer', 'survivor'], default='killer')
+  parser.add_argument('--mode', choices=['random', 'cycle'], default='cycle')
+  parser.add_argument('--exclude', nargs='*', default=[], help='characters to exclude in every session')
+  parser.add_argument('--sessions', type=int, default=100000)
+  parser.add_argument('--picks', type=int, default=60, help='picks per session')
+  parser.add_argument('--chunk', type=int, default=1000, help='sessions per worker task')
+  parser.add_argument('--workers', type=int, default=None)
+  parser.add_argument('--seed', type=int, default=None, help='root seed, random if omitted')
+  parser.add_argument('--output', help='write the summary and histograms to a JSON file')
+  args = parser.parse_args()
+
+  config = load_config(get_config_file_path(args.config))
+  # Check the exclusions here, not with a traceback in every worker
+  unknown = sorted(set(args.exclude) - set(config[args.team + 's']))
+  if unknown:
+    parser.error(f"unknown {args.team} characters to exclude: {', '.join(unknown)}")
+  roster = sorted(set(config[args.team + 's']) - set(args.exclude))
+  if len(roster) < 3:
+    parser.error(f"the exclusions leave {len(roster)} {args.team} characters, at least 3 are needed")
+  root = np.random.SeedSequence(args.seed)
+  chunks = [min(args.chunk, args.sessions - start) for start in range(0, args.sessions, args.chunk)]
+
+  total = {'frequency': Counter(), 'gaps': Counter(), 'back_to_back': 0, 'resets': 0, 'sessions': 0, 'picks': 0}
+  start = time.perf_counter()
+  with ProcessPoolExecutor(max_workers=args.workers) as executor:
+    futures = [
+      executor.submit(simulate_chunk, config, args.team, args.mode, args.exclude, sessions, args.picks, seed)
+      for sessions, seed in zip(chunks, root.spawn(len(chunks)))
+    ]
+    for done, future in enumerate(as_completed(futures), start=1):
+      merge(total, future.result())
+      print(f'\r{done}/{len(futures)} chunks, {total["picks"]} picks', end='', flush=True)
+  print(f' in {time.perf_counter() - start:.1f}s (root seed {root.entropy})\n')
+
+  weights = None
+  if args.mode == 'random':
+    # Random picks follow the configured weights, cycle picks do not
+    weights = [config[args.team + '_weights'].get(character, 1.0) for character in roster]
+  summary = summarize(total, roster, weights)
+  for key, value in summary.items():
+    print(f'{key:24} {value}')
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump({
+        'summary': summary,
+        'frequency': dict(total['frequency']),
+        'gaps': {str(gap): n for gap, n in sorted(total['gaps'].items())},
+      }, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,208 @@
+import json
+import os
+import time
+
+from selector import MIN_INCLUDED, CharacterSelector
+
+TEAMS = ('killer', 'survivor')
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+def dump_state(selector: CharacterSelector) -> dict:
+  '''Returns the selection state of a selector as a JSON serializable dictionary.'''
+  # The mode and team are settings, so they always come from settings.ini rather than from a saved state
+  return {
+    'teams': {
+      team: {
+        'unselected': sorted(selector.remaining_characters(team)),
+        'selected': sorted(selector.picked_characters(team)),
+        'excluded': sorted(selector.excluded_characters[team]),
+        'previous': selector.previous_selection[team],
+      }
+      for team in TEAMS
+    }
+  }
+
+
+def load_state(selector: CharacterSelector, state: dict) -> None:
+  '''Restores a state produced by dump_state, ignoring characters that are no longer in the roster.'''
+  for team in TEAMS:
+    saved = state['teams'][team]
+    roster = selector.rosters[team]
+    index = roster.index
+    pool = selector.pools[team]
+    pool.clear()
+    for character in saved['unselected']:
+      if character in index:
+        pool.add(index[character])
+    for character in saved['selected']:
+      if character in index:
+        pool.mark_drawn(index[character])
+    excluded = roster.mask(saved['excluded'])
+    if len(roster) - excluded.bit_count() < MIN_INCLUDED:
+      print(f"Warning: The saved {team} exclusions would leave fewer than {MIN_INCLUDED} characters. Clearing them.\n")
+      excluded = 0
+    selector.excluded_masks[team] = excluded
+    if pool.started:
+      # Characters that are neither in the saved cycle nor excluded, e.g. ones added to the roster since
+      # the state was saved, join the cycle in progress like update_roster does
+      pool.add_all(roster.indices(roster.full_mask & ~excluded))
+    selector.weight_tables[team] = None
+    selector.previous_ids[team] = index.get(saved['previous'])
+
+
+def apply_event(selector: CharacterSelector, event: str, team: str, character: str) -> None:
+  '''Replays a journaled event on a selector without drawing anything.'''
+  # The roster may have been edited since the event was written
+  if character is not None and character not in selector.config_characters[team]:
+    return
+  i = None if character is None else selector.rosters[team].index[character]
+  if event == 'random':
+    selector.previous_ids[team] = i
+  elif event == 'cycle':
+    selector.pools[team].mark_drawn(i)
+    selector.previous_ids[team] = i
+  elif event == 'reset':
+    selector._reset_cycle(team)
+  elif event == 'exclude':
+    selector.exclude_character(team, character)
+  elif event == 'include':
+    selector.include_character(team, character)
+  else:
+    raise ValueError(f"Unknown journal event: {event}")
+
+
+# The StateStore class persists a selector's state as a compacted snapshot plus an append-only journal.
+class StateStore:
+
+  def __init__(self,
+               path: str,
+               fsync: str = 'interval',
+               fsync_interval: float = 1.0,
+               snapshot_every: int = 10000,
+               buffer_size: int = 64 * 1024) -> None:
+    """
+    Initializes the StateStore.
+
+    Every state change is appended to '<path>.journal' as one tab separated
+    line with a sequence number. Every snapshot_every records the full state is
+    written to '<path>.snapshot' and the journal is truncated, so startup only
+    replays the records written since the last snapshot.
+
+    Args:
+        path (str): The base path of the snapshot and journal files.
+        fsync (str): 'always' to flush and fsync every record, 'interval' to do
+            so at most every fsync_interval seconds, 'never' to leave it to the OS.
+        fsync_interval (float): The number of seconds between syncs for 'interval'.
+        snapshot_every (int): The number of journal records between snapshots.
+        buffer_size (int): The size of the journal write buffer in bytes.
+    """
+    if fsync not in FSYNC_POLICIES:
+      raise ValueError(f"Invalid fsync policy: {fsync}")
+    self.snapshot_path = path + '.snapshot'
+    self.journal_path = path + '.journal'
+    self.fsync = fsync
+    self.fsync_interval = fsync_interval
+    self.snapshot_every = snapshot_every
+    self.buffer_size = buffer_size
+    self.selector = None
+    self.sequence = 0
+    self._pending = 0
+    self._last_sync = time.monotonic()
+    self._journal = None
+
+  def attach(self, selector: CharacterSelector) -> int:
+    """
+    Restores the saved state into a selector and starts journaling its changes.
+
+    Returns:
+        int: The number of journal records replayed after the snapshot.
+    """
+    self.selector = selector
+    snapshot_sequence = None
+    try:
+      with open(self.snapshot_path) as f:
+        snapshot = json.load(f)
+      snapshot_sequence = self.sequence = snapshot['sequence']
+      load_state(selector, snapshot['state'])
+    except FileNotFoundError:
+      pass
+
+    replayed = 0
+    torn = False
+    try:
+      with open(self.journal_path) as f:
+        for line in f:
+          # A line without its newline is a write cut short by a crash
+          if not line.endswith('\n'):
+            torn = True
+            break
+          sequence, event, team, character = line[:-1].split('\t')
+          sequence = int(sequence)
+          if snapshot_sequence is not None and sequence <= snapshot_sequence:
+            continue
+          apply_event(selector, event, team, character or None)
+          self.sequence = sequence
+          replayed += 1
+    except FileNotFoundError:
+      pass
+
+    if torn or snapshot_sequence is None:
+      # Start from a clean journal so a torn tail is never followed by new records
+      self.snapshot()
+    else:
+      # The journal ends on a whole record, so new records can follow it without rewriting anything at startup
+      self._journal = open(self.journal_path, 'a', buffering=self.buffer_size)
+      self._pending = replayed
+    selector.listeners.append(self.record)
+    return replayed
+
+  def record(self, event: str, team: str, character: str = None) -> None:
+    '''Appends a selector event to the journal. Used as a selector listener.'''
+    if event in ('batch', 'exclusions', 'roster'):
+      # These rewrite a whole team's state, which a snapshot captures in one go
+      self.snapshot()
+      return
+    self.sequence += 1
+    self._journal.write(f"{self.sequence}\t{event}\t{team}\t{character or ''}\n")
+    self._pending += 1
+    if self._pending >= self.snapshot_every:
+      self.snapshot()
+    elif self.fsync == 'always':
+      self._sync()
+    elif self.fsync == 'interval' and time.monotonic() - self._last_sync >= self.fsync_interval:
+      self._sync()
+
+  def _sync(self) -> None:
+    self._journal.flush()
+    os.fsync(self._journal.fileno())
+    self._last_sync = time.monotonic()
+
+  def snapshot(self) -> None:
+    '''Writes the full state to the snapshot file and starts a new, empty journal.'''
+    temporary_path = self.snapshot_path + '.tmp'
+    with open(temporary_path, 'w') as f:
+      json.dump({'sequence': self.sequence, 'state': dump_state(self.selector)}, f)
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(temporary_path, self.snapshot_path)
+
+    # Records up to the snapshot sequence are skipped on replay, so a crash before this truncation is harmless
+    if self._journal is not None:
+      self._journal.close()
+    self._journal = open(self.journal_path, 'w', buffering=self.buffer_size)
+    self._pending = 0
+
+  def flush(self) -> None:
+    '''Writes buffered journal records to disk.'''
+    if self._journal is not None:
+      self._sync()
+
+  def close(self) -> None:
+    '''Snapshots the final state and closes the journal.'''
+    if self._journal is None:
+      return
+    self.selector.listeners.remove(self.record)
+    self.snapshot()
+    self._journal.close()
+    self._journal = None
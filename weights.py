@@ -0,0 +1,101 @@
+# Below this share of the table's weight left to draw, rejection sampling falls back to a linear scan
+MIN_ACCEPTED_SHARE = 0.1
+
+
+# The AliasTable class draws weighted random items in O(1) with Vose's alias method.
+class AliasTable:
+
+  def __init__(self, weights: dict = None) -> None:
+    """
+    Initializes the AliasTable.
+
+    The table is built once and never changes, so it can be shared between
+    selectors and threads. Items with a weight of 0 are left out. Exclusions
+    are handled by building a table of the included items only (see
+    TeamRoster.weight_table); the few items to avoid on a single draw (the
+    previous pick, characters taken by other players) are rejected instead.
+
+    Args:
+        weights (dict): The weight of each item.
+
+    Raises:
+        ValueError: If a weight is negative.
+    """
+    self.weights = {}
+    for item, weight in (weights or {}).items():
+      if weight < 0:
+        raise ValueError(f"Weight of {item} must not be negative: {weight}")
+      if weight > 0:
+        self.weights[item] = float(weight)
+    items = list(self.weights)
+    size = len(items)
+    total = sum(self.weights.values())
+    probability = [0.0] * size
+    alias = [0] * size
+
+    # Scale the weights so the average column is 1, then pair each short column with a tall one
+    scaled = [self.weights[item] * size / total for item in items] if size else []
+    small = [i for i, value in enumerate(scaled) if value < 1.0]
+    large = [i for i, value in enumerate(scaled) if value >= 1.0]
+    while small and large:
+      less = small.pop()
+      more = large.pop()
+      probability[less] = scaled[less]
+      alias[less] = more
+      scaled[more] -= 1.0 - scaled[less]
+      if scaled[more] < 1.0:
+        small.append(more)
+      else:
+        large.append(more)
+    # Whatever is left is 1 up to rounding errors
+    for i in large + small:
+      probability[i] = 1.0
+
+    self._items = items
+    self._probability = probability
+    self._alias = alias
+    self._total = total
+
+  def __len__(self) -> int:
+    return len(self._items)
+
+  def sample(self, rng, avoid=None, others=()):
+    """
+    Returns a random item with probability proportional to its weight.
+
+    Args:
+        rng: A random number generator providing random (e.g. the random module).
+        avoid: An item that must not be returned.
+        others (collection): More items that must not be returned.
+
+    Raises:
+        IndexError: If no item with a positive weight is left to draw.
+    """
+    weights = self.weights
+    available = self._total - weights.get(avoid, 0.0)
+    for item in others:
+      if item != avoid:
+        available -= weights.get(item, 0.0)
+    # Allow for rounding errors left by subtracting the weights one by one
+    if available <= self._total * 1e-12 or not self._items:
+      raise IndexError('Cannot choose from an empty table')
+
+    if available < self._total * MIN_ACCEPTED_SHARE:
+      # Most draws would be rejected, so pick directly from what is left
+      candidates = [item for item in self._items if item != avoid and item not in others]
+      return rng.choices(candidates, [weights[item] for item in candidates])[0]
+
+    items = self._items
+    probability = self._probability
+    size = len(items)
+    while True:
+      column = rng.random() * size
+      index = int(column)
+      if index == size:
+        index -= 1
+      # The fractional part decides between the column's own item and its alias
+      if column - index >= probability[index]:
+        index = self._alias[index]
+      item = items[index]
+      if item != avoid and item not in others:
+        return item